@@ -0,0 +1,3 @@
+# cafe_common
+# Modul yang dipakai bersama oleh backend (src/app.py) dan service rekomendasi (ubcf_api/main.py).
+# Kedua service menambahkan root repo ke sys.path sebelum meng-import paket ini.
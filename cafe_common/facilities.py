@@ -0,0 +1,107 @@
+# facilities.py
+# Fasilitas kafe sebagai bitmask: teks seperti "Toilet, AC & Live Music" diparse ke kosakata
+# kanonik, lalu tiap kafe disimpan sebagai bitmask integer untuk pencocokan vektor.
+
+import functools
+import re
+import threading
+
+import numpy as np
+
+FACILITY_VOCAB = ["Free Wi-Fi", "Toilet", "AC", "Buku", "Photobooth", "Carwash", "Bar", "Playground", "Live Music"]
+_FACILITY_ALIASES = {"wifi": "freewifi", "tempatbermainanakanak": "playground"}
+_FACILITY_MAX_BITS = 63
+# jumlah teks fasilitas berbeda yang hasil parse-nya disimpan
+FACILITY_MEMO_SIZE = 4096
+_facility_bits = {}
+_facility_names = []
+_facility_lock = threading.Lock()
+
+
+def _facility_key(name):
+    key = re.sub(r"[^a-z0-9]", "", str(name).lower())
+    return _FACILITY_ALIASES.get(key, key)
+
+
+def _facility_bit(name, create=False):
+    key = _facility_key(name)
+    if not key:
+        return None
+    if key in _facility_bits:
+        return _facility_bits[key]
+    if not create:
+        return None
+    with _facility_lock:
+        if key not in _facility_bits:
+            if len(_facility_names) >= _FACILITY_MAX_BITS:
+                return None
+            _facility_bits[key] = len(_facility_names)
+            _facility_names.append(str(name).strip())
+        return _facility_bits[key]
+
+
+for _name in FACILITY_VOCAB:
+    _facility_bit(_name, create=True)
+
+
+# nama fasilitas sesuai urutan bit
+def facility_names():
+    return list(_facility_names)
+
+
+def parse_facilities(text):
+    if not text:
+        return []
+    return [p.strip() for p in re.split(r"[,&;/]|\bdan\b", str(text)) if p.strip()]
+
+
+# bit sebuah nama tidak pernah berubah setelah dibuat, jadi mask hasil create=True aman di-memo
+@functools.lru_cache(maxsize=FACILITY_MEMO_SIZE)
+def _registered_mask(text):
+    return _text_mask(text, create=True)
+
+
+def _text_mask(text, create):
+    mask = 0
+    for name in parse_facilities(text):
+        bit = _facility_bit(name, create=create)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+# teks fasilitas -> bitmask; create=False tidak menambah kosakata (mis. preferensi pengguna)
+def facility_mask(text, create=True):
+    text = text or ""
+    if create:
+        return _registered_mask(text)
+    return _text_mask(text, create=False)
+
+
+# mask permintaan; None jika ada fasilitas yang tidak dikenal (tidak mungkin terpenuhi pada mode "all")
+def query_facility_mask(names):
+    mask = 0
+    for name in names:
+        bit = _facility_bit(name)
+        if bit is None:
+            return None
+        mask |= 1 << bit
+    return mask
+
+
+# filter vektor: kafe yang punya semua (all) / salah satu (any) fasilitas yang diminta
+def facility_filter(masks, names, match="all"):
+    names = [n for n in names if str(n).strip()]
+    if not names:
+        return np.ones(len(masks), dtype=bool)
+    if match == "any":
+        want = 0
+        for name in names:
+            bit = _facility_bit(name)
+            if bit is not None:
+                want |= 1 << bit
+        return (masks & np.int64(want)) != 0
+    want = query_facility_mask(names)
+    if want is None:
+        return np.zeros(len(masks), dtype=bool)
+    return (masks & np.int64(want)) == np.int64(want)
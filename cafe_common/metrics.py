@@ -0,0 +1,169 @@
+# metrics.py
+# Counter & histogram per thread tanpa lock di hot path, plus format teks Prometheus untuk /metrics.
+# Metrik spesifik tiap service (cache, backend, database) dibuat di service masing-masing.
+
+import abc
+import threading
+from bisect import bisect_left
+
+TIMING_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# agregasi per thread: tiap thread menulis ke dict miliknya sendiri sehingga hot path tanpa lock.
+# dict milik thread yang sudah selesai digabung ke "_retired" agar jumlahnya tidak terus bertambah
+class _ThreadShards(abc.ABC):
+    COMPACT_EVERY = 256
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) % self.COMPACT_EVERY == 0:
+                    self._compact()
+        return shard
+
+    # gabungkan isi satu shard ke dict "into"
+    @abc.abstractmethod
+    def _merge(self, into, shard):
+        ...
+
+    def _compact(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = alive
+
+    def snapshot(self):
+        with self._lock:
+            self._compact()
+            merged = {}
+            self._merge(merged, self._retired)
+            for _, shard in self._shards:
+                self._merge(merged, shard)
+        return merged
+
+    def clear(self):
+        with self._lock:
+            self._retired = {}
+            for _, shard in self._shards:
+                shard.clear()
+
+
+# penghitung monoton per key, mis. (method, route, status)
+class Counters(_ThreadShards):
+    def inc(self, key, n=1):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + n
+
+    def _merge(self, into, shard):
+        for key, n in list(shard.items()):
+            into[key] = into.get(key, 0) + n
+
+
+# histogram per key: [jumlah per bucket ..., jumlah +Inf, total, maksimum]
+class Histograms(_ThreadShards):
+    def __init__(self, buckets=TIMING_BUCKETS_MS):
+        super().__init__()
+        self.buckets = tuple(buckets)
+
+    def observe(self, key, value):
+        shard = self._shard()
+        h = shard.get(key)
+        if h is None:
+            h = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+        h[bisect_left(self.buckets, value)] += 1
+        h[-2] += value
+        if value > h[-1]:
+            h[-1] = value
+
+    def _merge(self, into, shard):
+        for key, h in list(shard.items()):
+            acc = into.get(key)
+            if acc is None:
+                into[key] = list(h)
+                continue
+            for i in range(len(h) - 1):
+                acc[i] += h[i]
+            acc[-1] = max(acc[-1], h[-1])
+
+    def _quantile(self, h, q):
+        count = sum(h[:-2])
+        need = q * count
+        running = 0
+        for bound, n in zip(self.buckets, h):
+            running += n
+            if running >= need:
+                return min(bound, h[-1])
+        return h[-1]
+
+    def stats(self):
+        out = {}
+        for name, h in sorted(self.snapshot().items()):
+            count = sum(h[:-2])
+            if not count:
+                continue
+            out[name] = {
+                "count": count,
+                "mean_ms": round(h[-2] / count, 3),
+                "p50_ms": self._quantile(h, 0.5),
+                "p95_ms": self._quantile(h, 0.95),
+                "p99_ms": self._quantile(h, 0.99),
+                "max_ms": round(h[-1], 3),
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], h[:-2])),
+            }
+        return out
+
+
+# FORMAT TEKS PROMETHEUS (/metrics)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _prom_labels(names, values):
+    if not names:
+        return ""
+    if not isinstance(values, tuple):
+        values = (values,)
+    pairs = []
+    for name, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _prom_value(v):
+    return repr(float(v)) if isinstance(v, float) else str(int(v))
+
+
+def prom_metric(lines, name, kind, help_text, samples, labels=()):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for key, value in sorted(samples.items(), key=lambda kv: str(kv[0])):
+        lines.append(f"{name}{_prom_labels(labels, key)} {_prom_value(value)}")
+
+
+# histogram Histograms (milidetik) -> bucket kumulatif dalam detik
+def prom_histogram(lines, name, help_text, hist, labels=()):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    le = labels + ("le",)
+    for key, h in sorted(hist.snapshot().items(), key=lambda kv: str(kv[0])):
+        key = key if isinstance(key, tuple) else (key,)
+        running = 0
+        for bound, n in zip(hist.buckets, h):
+            running += n
+            lines.append(f"{name}_bucket{_prom_labels(le, key + (f'{bound / 1000:g}',))} {running}")
+        running += h[len(hist.buckets)]
+        lines.append(f"{name}_bucket{_prom_labels(le, key + ('+Inf',))} {running}")
+        lines.append(f"{name}_sum{_prom_labels(labels, key)} {_prom_value(h[-2] / 1000.0)}")
+        lines.append(f"{name}_count{_prom_labels(labels, key)} {running}")
@@ -0,0 +1,40 @@
+# prices.py
+# HARGA: string seperti "16.000 - 42.000" / "Rp 15.000 s/d 30.000" diparse ke integer (min, max).
+# Dipakai saat data masuk (backend), migrasi skema, dan fallback service rekomendasi
+# untuk database yang belum dimigrasi.
+
+import re
+from decimal import Decimal
+
+PRICE_RANGE_FIELDS = ("harga_makanan", "harga_minuman")
+
+
+# "24.000" / "Rp24.000" / 24000 -> 24000; None jika tidak ada angka
+def parse_price(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return int(value)
+    digits = re.sub(r"[^0-9]", "", str(value))
+    return int(digits) if digits else None
+
+
+def parse_price_range(text):
+    if text is None:
+        return None, None
+    parts = [parse_price(p) for p in re.split(r"\s*[-–~]\s*|\s+s/d\s+", str(text).strip())]
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None, None
+    return min(parts), max(parts)
+
+
+# tambahkan kolom <field>_min / <field>_max ke payload kafe
+def with_price_columns(data):
+    out = dict(data)
+    for field in PRICE_RANGE_FIELDS:
+        if field in data:
+            lo, hi = parse_price_range(data.get(field))
+            out[f"{field}_min"] = lo
+            out[f"{field}_max"] = hi
+    return out
@@ -0,0 +1,156 @@
+# profiling.py
+# PROFILING ON-DEMAND (khusus admin)
+# ?profile=1|cpu (atau header X-Profile) menjalankan request di bawah cProfile, ?profile=mem memakai
+# tracemalloc. Hanya aktif bila token profiling di-set dan header X-Profile-Token cocok.
+# Hasil lengkap disimpan di direktori profil (.pstats untuk snakeviz / flameprof / gprof2dot,
+# .tracemalloc untuk tracemalloc.Snapshot.load), ringkasannya menggantikan body respons.
+# Hook Flask dipasang lewat init_profiling(app, token, directory).
+
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+from flask import g, jsonify, request
+
+PROFILE_TOP = 30
+PROFILE_FRAMES = 10
+# satu profil pada satu waktu (tracemalloc berlaku untuk seluruh proses)
+profile_lock = threading.Lock()
+_profile_settings = {"token": "", "dir": "profiles"}
+
+
+def profile_mode(args, headers):
+    mode = (args.get("profile") or headers.get("X-Profile") or "").strip().lower()
+    if mode in ("1", "true", "yes", "cpu"):
+        return "cpu"
+    return "mem" if mode == "mem" else None
+
+
+def profile_authorized(headers):
+    token = headers.get("X-Profile-Token", "")
+    expected = _profile_settings["token"]
+    return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+class Profiler:
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+        self._prof = None
+        self._before = None
+        self._own_tracing = False
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        if self.mode == "cpu":
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+            return
+        self._own_tracing = not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start(PROFILE_FRAMES)
+        else:
+            # tracemalloc sudah aktif dari luar: yang dilaporkan adalah selisih terhadap snapshot awal
+            self._before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+
+    def cancel(self):
+        if self._prof is not None:
+            self._prof.disable()
+        elif self._own_tracing:
+            tracemalloc.stop()
+
+    def stop(self):
+        wall_ms = round((time.perf_counter() - self._t0) * 1000.0, 2)
+        directory = _profile_settings["dir"]
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{int(time.time() * 1000)}-{self.label}")
+        if self.mode == "cpu":
+            self._prof.disable()
+            path += ".pstats"
+            self._prof.dump_stats(path)
+            stats = pstats.Stats(self._prof).sort_stats("cumulative")
+            top = []
+            for func in stats.fcn_list[:PROFILE_TOP]:
+                cc, nc, tt, ct, _ = stats.stats[func]
+                filename, line, name = func
+                top.append({
+                    "function": f"{filename}:{line}({name})",
+                    "ncalls": nc,
+                    "primitive_calls": cc,
+                    "tottime_ms": round(tt * 1000.0, 3),
+                    "cumtime_ms": round(ct * 1000.0, 3),
+                })
+            return {"mode": "cpu", "file": path, "wall_ms": wall_ms, "top": top}
+
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+        if self._own_tracing:
+            tracemalloc.stop()
+        path += ".tracemalloc"
+        snapshot.dump(path)
+        if self._before is not None:
+            stats = snapshot.compare_to(self._before.filter_traces(ignore), "lineno")
+            sites = [(s.traceback[0], s.size_diff, s.count_diff) for s in stats]
+        else:
+            sites = [(s.traceback[0], s.size, s.count) for s in snapshot.statistics("lineno")]
+        top = [{"site": f"{frame.filename}:{frame.lineno}", "size_kb": round(size / 1024.0, 1), "count": count}
+               for frame, size, count in sites[:PROFILE_TOP]]
+        return {
+            "mode": "mem",
+            "file": path,
+            "wall_ms": wall_ms,
+            "current_kb": round(current / 1024.0, 1),
+            "peak_kb": round(peak / 1024.0, 1),
+            "top": top,
+        }
+
+
+# pasang hook profiling; dipanggil setelah init_request_timing agar respons profil tetap
+# mendapat header Server-Timing
+def init_profiling(app, token, directory):
+    _profile_settings["token"] = token
+    _profile_settings["dir"] = directory
+
+    @app.before_request
+    def _start_profiling():
+        mode = profile_mode(request.args, request.headers)
+        if mode is None:
+            return None
+        if not profile_authorized(request.headers):
+            return jsonify({"error": "Profiling hanya untuk admin (header X-Profile-Token)"}), 403
+        if not profile_lock.acquire(blocking=False):
+            return jsonify({"error": "Profiling lain sedang berjalan"}), 409
+        g.profiler = Profiler(mode, request.endpoint or "unmatched")
+        g.profiler.start()
+
+    # body asli (bila JSON) ikut dikembalikan di bawah "response"
+    @app.after_request
+    def _finish_profiling(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        try:
+            report = profiler.stop()
+        finally:
+            profile_lock.release()
+        body = {"status": response.status_code, "profile": report}
+        if response.is_json:
+            body["response"] = response.get_json(silent=True)
+        out = jsonify(body)
+        out.status_code = response.status_code
+        return out
+
+    # request yang gagal sebelum after_request: hentikan profiler & lepas lock
+    @app.teardown_request
+    def _abort_profiling(exc):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.cancel()
+            profile_lock.release()
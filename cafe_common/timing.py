@@ -0,0 +1,128 @@
+# timing.py
+# PENGUKURAN WAKTU PER TAHAP
+# durasi tiap tahap dicatat ke request yang sedang berjalan (header Server-Timing + satu baris
+# log JSON) dan ke histogram agregat per tahap. Hook Flask dipasang lewat init_request_timing(app).
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import request
+
+from cafe_common.metrics import Counters, Histograms
+
+stage_stats = Histograms()
+# metrik request per route untuk /metrics
+request_counts = Counters()
+request_latency = Histograms()
+
+_request_timing = threading.local()
+_timing_settings = {"log": True}
+
+
+def observe_request(method, route, status, total_ms):
+    request_counts.inc((method, route, str(status)))
+    request_latency.observe((method, route), total_ms)
+
+
+def record_stage(name, ms):
+    stage_stats.observe(name, ms)
+    stages = getattr(_request_timing, "stages", None)
+    if stages is not None:
+        ent = stages.get(name)
+        if ent is None:
+            stages[name] = [ms, 1]
+        else:
+            ent[0] += ms
+            ent[1] += 1
+
+
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, (time.perf_counter() - t0) * 1000.0)
+
+
+# dekorator: seluruh pemanggilan fungsi dicatat sebagai satu tahap
+def timed(name):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_stage(name, (time.perf_counter() - t0) * 1000.0)
+        return inner
+    return wrap
+
+
+def begin_request_timing():
+    _request_timing.stages = {}
+    _request_timing.t0 = time.perf_counter()
+
+
+# -> (tahap {nama: [ms, jumlah panggilan]}, total ms), (None, None) bila tidak ada request aktif
+def end_request_timing():
+    stages = getattr(_request_timing, "stages", None)
+    if stages is None:
+        return None, None
+    total_ms = (time.perf_counter() - _request_timing.t0) * 1000.0
+    _request_timing.stages = None
+    stage_stats.observe("total", total_ms)
+    return stages, total_ms
+
+
+def server_timing_header(stages, total_ms):
+    parts = [f"{name};dur={ms:.2f}" for name, (ms, _) in stages.items()]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+def log_request_timing(method, path, status, stages, total_ms):
+    if not _timing_settings["log"]:
+        return
+    print(json.dumps({
+        "event": "request_timing",
+        "ts": round(time.time(), 3),
+        "method": method,
+        "path": path,
+        "status": status,
+        "total_ms": round(total_ms, 2),
+        "stages": {name: {"ms": round(ms, 2), "calls": n} for name, (ms, n) in stages.items()},
+    }), flush=True)
+
+
+# jalankan fn dengan pencatatan waktu per tahap (entry point di luar Flask, mis. asgi.py)
+def run_timed(fn, *args, **kwargs):
+    begin_request_timing()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stages, total_ms = end_request_timing()
+    return result, stages, total_ms
+
+
+# pasang hook before/after_request; log=False mematikan baris log JSON per request
+def init_request_timing(app, log=True):
+    _timing_settings["log"] = log
+
+    @app.before_request
+    def _start_request_timing():
+        begin_request_timing()
+
+    @app.after_request
+    def _finish_request_timing(response):
+        stages, total_ms = end_request_timing()
+        if stages is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            observe_request(request.method, route, response.status_code, total_ms)
+            response.headers["Server-Timing"] = server_timing_header(stages, total_ms)
+            response.headers["Timing-Allow-Origin"] = "*"
+            log_request_timing(request.method, request.path, response.status_code, stages, total_ms)
+        return response
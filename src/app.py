@@ -1,15 +1,45 @@
 # app.py
-from flask import Flask, jsonify, request, send_from_directory, abort
+from flask import Flask, Response, abort, jsonify, request, send_from_directory
 from flask_cors import CORS
-from sentiment import analyze_reviews
 import mysql.connector
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from decimal import Decimal
+import datetime
+import functools
 import json
 import os
+import sys
+import threading
+import time
+import numpy as np
+import requests
 from werkzeug.utils import secure_filename
 import uuid
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# modul bersama (cafe_common) ada di root repo
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from cafe_common.facilities import facility_filter, facility_mask
+from cafe_common.prices import parse_price, parse_price_range, with_price_columns
+from cafe_common.metrics import PROMETHEUS_CONTENT_TYPE, TIMING_BUCKETS_MS, Counters, Histograms, prom_histogram, prom_metric
+from cafe_common.timing import init_request_timing, record_stage, request_counts, request_latency, stage, stage_stats
+from cafe_common.profiling import init_profiling
+
+# pipeline SVM sentimen dimuat saat modul sentiment di-import; durasinya dilaporkan di /metrics
+_sentiment_load_start = time.perf_counter()
+from sentiment import analyze_reviews
+SENTIMENT_MODEL_LOAD_S = time.perf_counter() - _sentiment_load_start
+SENTIMENT_MODEL_LOADED_AT = time.time()
+
 app = Flask(__name__)
 CORS(app)
 
@@ -28,6 +58,39 @@ def allowed_file(filename):
     ext = filename.rsplit(".", 1)[1].lower()
     return ext in ALLOWED_EXTENSIONS
 
+# PENGUKURAN WAKTU PER TAHAP (cafe_common.timing)
+# durasi koneksi & query database, analisis sentimen, dll. dicatat ke request yang sedang berjalan
+# (header Server-Timing + satu baris log JSON) dan ke histogram agregat per tahap (/api/timing/stats)
+TIMING_LOG = os.environ.get("TIMING_LOG", "1") == "1"
+init_request_timing(app, log=TIMING_LOG)
+
+# metrik operasional untuk /metrics (query database, lookup cache)
+_db_latency = Histograms()
+_cache_counts = Counters()
+
+# dekorator untuk helper database: seluruh pemanggilan dicatat sebagai tahap "db_<helper>"
+# sekaligus ke histogram latensi query per helper
+def db_timed(helper):
+    name = f"db_{helper}"
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - t0) * 1000.0
+                record_stage(name, ms)
+                _db_latency.observe(helper, ms)
+        return inner
+    return wrap
+
+# PROFILING ON-DEMAND (khusus admin, cafe_common.profiling)
+# ?profile=1|cpu|mem dengan header X-Profile-Token = PROFILE_TOKEN; hasil disimpan di PROFILE_DIR
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+init_profiling(app, PROFILE_TOKEN, PROFILE_DIR)
+
 # konfigurasi koneksi database
 DB_CONFIG = {
     "host": "localhost",
@@ -36,10 +99,61 @@ DB_CONFIG = {
     "database": "cafe_databases"
 }
 
+@db_timed("connect")
 def get_db_connection():
     return mysql.connector.connect(**DB_CONFIG)
 
+# format kolumnar ringkas (msgpack) untuk endpoint bulk, dipilih lewat header Accept
+COLUMNAR_MIMETYPE = "application/x-msgpack"
+
+def _wire_value(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime.date, datetime.datetime)):
+        return v.isoformat()
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode("utf-8", errors="replace")
+    return v
+
+def wants_columnar():
+    if msgpack is None:
+        return False
+    best = request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE])
+    return best == COLUMNAR_MIMETYPE
+
+# list of dict -> {"columns": [...], "data": [kolom1[], kolom2[], ...]}
+def rows_response(rows, status=200):
+    if not wants_columnar():
+        return jsonify(rows), status
+    columns = list(rows[0].keys()) if rows else []
+    payload = {
+        "columns": columns,
+        "data": [[_wire_value(r.get(c)) for r in rows] for c in columns],
+    }
+    return Response(msgpack.packb(payload, use_bin_type=True, default=_wire_value), status=status, mimetype=COLUMNAR_MIMETYPE)
+
+# service rekomendasi (ubcf_api) yang perlu diberi tahu saat data pengguna berubah
+RECOMMENDER_BASE = os.environ.get("RECOMMENDER_BASE", "http://127.0.0.1:5000").rstrip("/")
+
+# dikirim dari satu thread latar agar request tulis tidak menunggu service rekomendasi
+_notify_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommender-notify")
+
+def _post_invalidate(id_user):
+    try:
+        requests.post(f"{RECOMMENDER_BASE}/api/cache/invalidate/{id_user}", timeout=0.5)
+    except requests.exceptions.RequestException as e:
+        app.logger.warning("Gagal invalidasi cache rekomendasi untuk user %s: %s", id_user, e)
+
+def notify_recommender_invalidate(id_user):
+    try:
+        id_user = int(id_user)
+    except (ValueError, TypeError):
+        app.logger.warning("Invalidasi cache rekomendasi dilewati: id_user tidak valid (%r)", id_user)
+        return
+    _notify_pool.submit(_post_invalidate, id_user)
+
 # API CAFE
+@db_timed("data")
 def get_data(search_term=None):
     db = get_db_connection()
     cursor = db.cursor()
@@ -64,6 +178,7 @@ def get_data(search_term=None):
         results.append(od)
     return results
 
+@db_timed("menu")
 def get_menu(search_term=None):
     db = get_db_connection()
     cursor = db.cursor()
@@ -89,6 +204,7 @@ def get_menu(search_term=None):
         results.append(od)
     return results
 
+@db_timed("data_by_id")
 def get_data_by_id(nomor):
     db = get_db_connection()
     cursor = db.cursor()
@@ -110,7 +226,51 @@ def get_data_by_id(nomor):
     else:
         return None
 
+# detail banyak kafe sekaligus (satu query WHERE nomor IN (...)); baris disimpan di cache
+# per nomor selama CAFE_CACHE_TTL detik dan dibuang saat kafe diubah / dihapus
+CAFE_CACHE_TTL = 60
+MAX_IDS_PER_REQUEST = 500
+_cafe_row_cache = {"rows": {}, "lock": threading.Lock()}
+
+def invalidate_cafe_cache(nomor=None):
+    with _cafe_row_cache["lock"]:
+        if nomor is None:
+            _cafe_row_cache["rows"].clear()
+        else:
+            _cafe_row_cache["rows"].pop(int(nomor), None)
+
+@db_timed("data_by_ids")
+def get_data_by_ids(ids):
+    now = datetime.datetime.now().timestamp()
+    found = {}
+    with _cafe_row_cache["lock"]:
+        for nomor in ids:
+            ent = _cafe_row_cache["rows"].get(nomor)
+            if ent is not None and now - ent[0] <= CAFE_CACHE_TTL:
+                found[nomor] = ent[1]
+    missing = [nomor for nomor in ids if nomor not in found]
+    _cache_counts.inc(("cafe_rows", "hit"), len(found))
+    _cache_counts.inc(("cafe_rows", "miss"), len(missing))
+    if missing:
+        db = get_db_connection()
+        cursor = db.cursor()
+        cursor.execute("SHOW COLUMNS FROM cafe_tables")
+        columns = [col[0] for col in cursor.fetchall()]
+        placeholders = ", ".join(["%s"] * len(missing))
+        cursor.execute(f"SELECT * FROM cafe_tables WHERE nomor IN ({placeholders})", tuple(missing))
+        rows = cursor.fetchall()
+        cursor.close()
+        db.close()
+
+        with _cafe_row_cache["lock"]:
+            for row in rows:
+                od = OrderedDict(zip(columns, row))
+                found[int(od["nomor"])] = od
+                _cafe_row_cache["rows"][int(od["nomor"])] = (now, od)
+    return [found[nomor] for nomor in ids if nomor in found]
+
 # API MENU
+@db_timed("menu_by_id")
 def get_menu_by_id(id_cafe):
     db = get_db_connection()
     cursor = db.cursor()
@@ -137,6 +297,7 @@ def get_menu_by_id(id_cafe):
     return menus
 
 # API REVIEWS
+@db_timed("reviews")
 def get_reviews(id_kafe=None):
     db = None
     cursor = None
@@ -185,6 +346,7 @@ def get_reviews(id_kafe=None):
             pass
 
 # API AUTHENTICATION
+@db_timed("register_user")
 def register_user_helper(data):
     username = data.get("username")
     password = data.get("password")
@@ -212,6 +374,7 @@ def register_user_helper(data):
     except Exception as e:
         return {"error": str(e)}, 500
 
+@db_timed("login_user")
 def login_user_helper(data):
     username = data.get("username")
     password = data.get("password")
@@ -246,6 +409,7 @@ def login_user_helper(data):
         return {"error": str(e)}, 500
 
 # API ADMIN
+@db_timed("login_admin")
 def login_admin_helper(data):
     username = data.get("username")
     password = data.get("password")
@@ -273,6 +437,7 @@ def login_admin_helper(data):
     except Exception as e:
         return {"error": str(e)}, 500
 
+@db_timed("admin_by_id")
 def get_admin_by_id(id_admin):
     try:
         db = get_db_connection()
@@ -297,6 +462,7 @@ def get_admin_by_id(id_admin):
         return {"error": str(e)}
 
 # API USER
+@db_timed("user_by_id")
 def get_user_by_id(id_user):
     try:
         db = get_db_connection()
@@ -359,6 +525,7 @@ def get_user_by_id(id_user):
     except Exception as e:
         return {"error": str(e)}
 
+@db_timed("update_user_preferences")
 def update_user_preferences_helper(data):
     user_id = data.get("user_id")
     preferensi_jarak_minimal = data.get("preferensi_jarak_minimal")
@@ -389,6 +556,7 @@ def update_user_preferences_helper(data):
         return {"error": str(e)}, 500
 
 # API VISITED
+@db_timed("visited_cafe")
 def get_visited_cafe(id_user):
     try:
         db = get_db_connection()
@@ -413,6 +581,7 @@ def get_visited_cafe(id_user):
     except Exception as e:
         return {"error": str(e)}
 
+@db_timed("add_visited_cafe")
 def add_visited_cafe_helper(id_user, cafe_id):
     try:
         db = get_db_connection()
@@ -434,6 +603,7 @@ def add_visited_cafe_helper(id_user, cafe_id):
         db.close()
 
         if updated:
+            notify_recommender_invalidate(id_user)
             return {"message": "Visited cafe berhasil ditambahkan"}, 200
         else:
             return {"error": "User tidak ditemukan"}, 404
@@ -442,6 +612,7 @@ def add_visited_cafe_helper(id_user, cafe_id):
         return {"error": str(e)}, 500
 
 # API MENU FAVORITE
+@db_timed("favorite_menu")
 def get_favorite_menu(id_user):
     try:
         db = get_db_connection()
@@ -466,11 +637,12 @@ def get_favorite_menu(id_user):
     except Exception as e:
         return {"error": str(e)}
     
+@db_timed("add_favorite_menu")
 def add_favorite_menu_helper(data):
     user_id   = data.get("user_id")
     id_cafe   = data.get("id_cafe")
     nama_menu = data.get("nama_menu")
-    harga     = data.get("harga")
+    harga     = parse_price(data.get("harga"))
 
     if not (user_id and id_cafe and nama_menu and harga is not None):
         return {"error": "user_id, id_cafe, nama_menu, dan harga wajib diisi"}, 400
@@ -500,6 +672,7 @@ def add_favorite_menu_helper(data):
         db.close()
 
         if updated:
+            notify_recommender_invalidate(user_id)
             return {"message": "Menu favorit berhasil ditambahkan"}, 200
         else:
             return {"error": "User tidak ditemukan"}, 404
@@ -508,6 +681,7 @@ def add_favorite_menu_helper(data):
         return {"error": str(e)}, 500
 
 # API FEEDBACK
+@db_timed("add_user_feedback")
 def add_user_feedback_helper(data):
     id_user = data.get("id_user")
     user_feedback = data.get("user_feedback")
@@ -528,6 +702,7 @@ def add_user_feedback_helper(data):
     except Exception as e:
         return {"error": str(e)}, 500
     
+@db_timed("all_feedbacks")
 def get_all_feedbacks():
     try:
         db = get_db_connection()
@@ -552,6 +727,7 @@ def get_all_feedbacks():
         return {"error": str(e)}
 
 # API DELETE 
+@db_timed("delete_user_by_id")
 def delete_user_by_id_helper(id_user):
     try:
         db = get_db_connection()
@@ -568,6 +744,7 @@ def delete_user_by_id_helper(id_user):
     except Exception as e:
         return {"error": str(e)}, 500
 
+@db_timed("delete_cafe_by_nomor")
 def delete_cafe_by_nomor_helper(nomor):
     try:
         db = get_db_connection()
@@ -597,6 +774,7 @@ def delete_cafe_by_nomor_helper(nomor):
     except Exception as e:
         return {"error": str(e)}, 500
     
+@db_timed("delete_feedback_by_id")
 def delete_feedback_by_id_helper(id_feedback):
     try:
         db = get_db_connection()
@@ -614,9 +792,11 @@ def delete_feedback_by_id_helper(id_feedback):
         return {"error": str(e)}, 500
 
 # API POST/CREATE
+@db_timed("create_cafe")
 def create_cafe_helper(data):
     if not isinstance(data, dict) or not data:
         return {"error": "Payload harus berformat JSON dan tidak kosong"}, 400
+    data = with_price_columns(data)
 
     try:
         db = get_db_connection()
@@ -664,9 +844,11 @@ def create_cafe_helper(data):
         return {"error": str(e)}, 500
 
 # API UPDATE
+@db_timed("update_cafe_by_nomor")
 def update_cafe_by_nomor_helper(nomor, data):
     if not isinstance(data, dict) or not data:
         return {"error": "Payload harus berformat JSON dan berisi field untuk diupdate"}, 400
+    data = with_price_columns(data)
 
     try:
         db = get_db_connection()
@@ -699,6 +881,7 @@ def update_cafe_by_nomor_helper(nomor, data):
         return {"error": str(e)}, 500
 
 # API UPLOAD CAFE IMAGE
+@db_timed("existing_cafe_image")
 def get_existing_cafe_image(nomor):
     try:
         db = get_db_connection()
@@ -714,6 +897,7 @@ def get_existing_cafe_image(nomor):
         print("Error fetching existing cafe image:", e)
         return None
 
+@db_timed("update_cafe_image_path")
 def update_cafe_image_path(nomor, image_path):
     try:
         db = get_db_connection()
@@ -724,6 +908,7 @@ def update_cafe_image_path(nomor, image_path):
         updated = cursor.rowcount
         cursor.close()
         db.close()
+        invalidate_cafe_cache(nomor)
         return bool(updated)
     except Exception as e:
         print("Error updating gambar_kafe:", e)
@@ -791,6 +976,7 @@ def api_update_user_preferences():
     return jsonify(result), status
 
 # endpoint users
+@db_timed("all_users")
 def get_all_users():
     try:
         db = get_db_connection()
@@ -818,7 +1004,7 @@ def api_get_all_users():
     users = get_all_users()
     if isinstance(users, dict) and users.get("error"):
         return jsonify(users), 500
-    return jsonify(users), 200    
+    return rows_response(users)
 
 @app.route('/api/users/<int:id_user>', methods=['GET', 'DELETE'])
 def api_user_by_id(id_user):
@@ -832,6 +1018,241 @@ def api_user_by_id(id_user):
         result, status = delete_user_by_id_helper(id_user)
         return jsonify(result), status
 
+# API STATISTIK KUNJUNGAN
+# riwayat kunjungan (JSON di user_tables) dipecah di sisi MySQL dengan JSON_TABLE lalu diagregasi,
+# jadi klien tidak perlu mengunduh seluruh pengguna. Item boleh {"id_cafe": 12} (atau kunci nomor /
+# cafe_id / id) maupun angka saja; nama kafe & string "1,2,3" dinormalisasi oleh migrate_schema.py
+VISITS_CTE = """
+    WITH raw_visits AS (
+        SELECT u.id_user, v.pos, COALESCE(v.id_cafe, v.nomor, v.cafe_id, v.id, v.raw_id) AS id_cafe
+        FROM user_tables u,
+        JSON_TABLE(
+            IF(JSON_VALID(u.cafe_telah_dikunjungi), u.cafe_telah_dikunjungi, '[]'),
+            '$[*]' COLUMNS (
+                pos FOR ORDINALITY,
+                id_cafe INT PATH '$.id_cafe' NULL ON ERROR,
+                nomor INT PATH '$.nomor' NULL ON ERROR,
+                cafe_id INT PATH '$.cafe_id' NULL ON ERROR,
+                id INT PATH '$.id' NULL ON ERROR,
+                raw_id INT PATH '$' NULL ON ERROR
+            )
+        ) v
+    ),
+    visits AS (
+        SELECT id_user, id_cafe, ROW_NUMBER() OVER (PARTITION BY id_user ORDER BY pos) AS urutan
+        FROM raw_visits
+        WHERE id_cafe IS NOT NULL
+    )
+"""
+
+@db_timed("visit_stats")
+def get_visit_stats(limit=None):
+    try:
+        db = get_db_connection()
+        cursor = db.cursor()
+        query = VISITS_CTE + """
+            SELECT v.id_cafe, c.nama_kafe, COUNT(*) AS jumlah
+            FROM visits v
+            LEFT JOIN cafe_tables c ON c.nomor = v.id_cafe
+            GROUP BY v.id_cafe, c.nama_kafe
+            ORDER BY jumlah DESC, v.id_cafe
+        """
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        cursor.close()
+        db.close()
+
+        total = sum(int(r[2]) for r in rows)
+        if limit:
+            rows = rows[:limit]
+        cafes = [{"id_kafe": r[0], "nama_kafe": r[1], "jumlah_kunjungan": int(r[2])} for r in rows]
+        return {"total_kunjungan": total, "cafes": cafes}
+    except Exception as e:
+        return {"error": str(e)}
+
+# kafe yang dikunjungi tepat SETELAH kafe sumber (transisi a -> b berurutan per pengguna)
+@db_timed("transition_stats")
+def get_transition_stats(cafe_id, limit=None):
+    try:
+        db = get_db_connection()
+        cursor = db.cursor()
+        query = VISITS_CTE + """
+            SELECT b.id_cafe, c.nama_kafe, COUNT(*) AS jumlah
+            FROM visits a
+            JOIN visits b ON b.id_user = a.id_user AND b.urutan = a.urutan + 1
+            LEFT JOIN cafe_tables c ON c.nomor = b.id_cafe
+            WHERE a.id_cafe = %s
+            GROUP BY b.id_cafe, c.nama_kafe
+            ORDER BY jumlah DESC, b.id_cafe
+        """
+        cursor.execute(query, (cafe_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        db.close()
+
+        if limit:
+            rows = rows[:limit]
+        return [{"id_kafe": r[0], "nama_kafe": r[1], "jumlah_kunjungan_setelah": int(r[2])} for r in rows]
+    except Exception as e:
+        return {"error": str(e)}
+
+def _limit_arg():
+    try:
+        limit = int(request.args.get("top", 0))
+    except (ValueError, TypeError):
+        limit = 0
+    return limit if limit > 0 else None
+
+# metrik operasional format teks Prometheus
+def render_metrics():
+    lines = []
+    prom_metric(lines, "cafe_api_http_requests_total", "counter", "Jumlah request HTTP per route dan status.",
+                request_counts.snapshot(), ("method", "route", "status"))
+    prom_histogram(lines, "cafe_api_http_request_duration_seconds", "Latensi request HTTP per route.",
+                   request_latency, ("method", "route"))
+    prom_histogram(lines, "cafe_api_db_query_duration_seconds",
+                   "Durasi helper database (termasuk koneksi) per helper.", _db_latency, ("helper",))
+    with _cafe_row_cache["lock"]:
+        cafe_rows = len(_cafe_row_cache["rows"])
+    prom_metric(lines, "cafe_api_cache_lookups_total", "counter", "Lookup cache per hasil (hit/miss).",
+                _cache_counts.snapshot(), ("cache", "result"))
+    prom_metric(lines, "cafe_api_cache_entries", "gauge", "Jumlah entri di cache.", {"cafe_rows": cafe_rows}, ("cache",))
+    prom_metric(lines, "cafe_api_model_age_seconds", "gauge", "Umur model sentimen sejak dimuat.",
+                {"sentiment": time.time() - SENTIMENT_MODEL_LOADED_AT}, ("model",))
+    prom_metric(lines, "cafe_api_model_load_duration_seconds", "gauge", "Durasi memuat model sentimen.",
+                {"sentiment": SENTIMENT_MODEL_LOAD_S}, ("model",))
+    prom_histogram(lines, "cafe_api_stage_duration_seconds", "Durasi per tahap (database, sentimen).",
+                   stage_stats, ("stage",))
+    return "\n".join(lines) + "\n"
+
+@app.route('/metrics', methods=['GET'])
+def api_metrics():
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# histogram durasi per tahap (koneksi & query database, sentimen) sejak proses berjalan
+@app.route('/api/timing/stats', methods=['GET'])
+def api_timing_stats():
+    return jsonify({"buckets_ms": list(TIMING_BUCKETS_MS), "stages": stage_stats.stats()}), 200
+
+@app.route('/api/stats/visits', methods=['GET'])
+def api_stats_visits():
+    result = get_visit_stats(_limit_arg())
+    if result.get("error"):
+        return jsonify(result), 500
+    return jsonify(result), 200
+
+@app.route('/api/stats/transitions/<int:cafe_id>', methods=['GET'])
+def api_stats_transitions(cafe_id):
+    result = get_transition_stats(cafe_id, _limit_arg())
+    if isinstance(result, dict) and result.get("error"):
+        return jsonify(result), 500
+    return jsonify({"source_cafe_id": cafe_id, "results": result}), 200
+
+# API PROFIL RINGKAS (untuk service rekomendasi)
+# hanya id, urutan kunjungan (array int), menu favorit sebagai array paralel
+# (id kafe, id menu yang di-intern ke tabel "menus", harga) dan preferensi pengguna.
+# ?since=<unix ts> hanya mengirim profil yang berubah sejak waktu itu (butuh kolom updated_at)
+PROFILE_COLUMNS = (
+    "id_user", "cafe_telah_dikunjungi", "menu_yang_disukai",
+    "preferensi_jarak_minimal", "preferensi_jarak_maksimal", "preferensi_fasilitas",
+)
+
+def _json_list(raw):
+    if isinstance(raw, list):
+        return raw
+    try:
+        value = json.loads(raw or "[]")
+    except (ValueError, TypeError):
+        return []
+    return value if isinstance(value, list) else []
+
+# kunci id kunjungan yang diterima, sesuai urutan COALESCE pada VISITS_CTE
+VISIT_ID_KEYS = ("id_cafe", "nomor", "cafe_id", "id")
+
+def _visit_id(it):
+    values = [it.get(k) for k in VISIT_ID_KEYS] if isinstance(it, dict) else [it]
+    for value in values:
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def _visit_ids(raw):
+    return [cid for cid in map(_visit_id, _json_list(raw)) if cid is not None]
+
+@db_timed("profiles")
+def get_profiles(since=None):
+    try:
+        db = get_db_connection()
+        cursor = db.cursor()
+        cursor.execute("SHOW COLUMNS FROM user_tables")
+        incremental = since is not None and "updated_at" in {col[0] for col in cursor.fetchall()}
+
+        # waktu server diambil sebelum query, dipakai klien sebagai since berikutnya
+        cursor.execute("SELECT UNIX_TIMESTAMP()")
+        server_time = int(cursor.fetchone()[0])
+
+        query = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM user_tables"
+        params = ()
+        if incremental:
+            query += " WHERE updated_at >= FROM_UNIXTIME(%s)"
+            params = (since,)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+        all_ids = None
+        if incremental:
+            cursor.execute("SELECT id_user FROM user_tables")
+            all_ids = [int(r[0]) for r in cursor.fetchall()]
+        cursor.close()
+        db.close()
+    except Exception as e:
+        return {"error": str(e)}
+
+    menus = {}
+    profiles = []
+    for row in rows:
+        r = dict(zip(PROFILE_COLUMNS, row))
+        fav_cafe, fav_menu, fav_harga = [], [], []
+        for m in _json_list(r["menu_yang_disukai"]):
+            if not isinstance(m, dict) or "id_cafe" not in m:
+                continue
+            try:
+                cid = int(m["id_cafe"])
+            except (ValueError, TypeError):
+                continue
+            fav_cafe.append(cid)
+            fav_menu.append(menus.setdefault(str(m.get("nama_menu") or ""), len(menus)))
+            fav_harga.append(parse_price(m.get("harga")))
+        profiles.append({
+            "id_user": int(r["id_user"]),
+            "visits": _visit_ids(r["cafe_telah_dikunjungi"]),
+            "fav_cafe": fav_cafe,
+            "fav_menu": fav_menu,
+            "fav_harga": fav_harga,
+            "preferensi_jarak_minimal": r["preferensi_jarak_minimal"],
+            "preferensi_jarak_maksimal": r["preferensi_jarak_maksimal"],
+            "preferensi_fasilitas": r["preferensi_fasilitas"],
+        })
+
+    body = {"server_time": server_time, "full": not incremental, "menus": list(menus), "profiles": profiles}
+    if incremental:
+        body["all_ids"] = all_ids
+    return body
+
+@app.route('/api/profiles', methods=['GET'])
+def api_profiles():
+    since = request.args.get("since")
+    try:
+        since = int(float(since)) if since not in (None, "") else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Parameter since harus unix timestamp"}), 400
+    result = get_profiles(since)
+    if result.get("error"):
+        return jsonify(result), 500
+    return jsonify(result), 200
+
 # endpoitn admin
 @app.route('/api/login_admin', methods=['POST'])
 def api_login_admin():
@@ -856,16 +1277,59 @@ def api_sentiment(id_kafe):
     if not isinstance(reviews, list):
         return jsonify({"error": "Failed to fetch reviews"}), 500
     reviews_copy = deepcopy(reviews)
-    analyzed = analyze_reviews(reviews_copy, id_kafe)
+    with stage("sentiment"):
+        analyzed = analyze_reviews(reviews_copy, id_kafe)
     if analyzed is None:
         return jsonify({"error": "Sentiment analysis returned nothing"}), 500
 
     return jsonify(analyzed), 200
 
+# sentimen seluruh kafe dalam satu kali query (untuk warm-up cache di ubcf_api)
+@app.route('/api/sentiments', methods=['GET'])
+def api_sentiments_bulk():
+    reviews = get_reviews()
+    if not isinstance(reviews, list):
+        return jsonify({"error": "Failed to fetch reviews"}), 500
+    grouped = OrderedDict()
+    for r in reviews:
+        grouped.setdefault(r.get("id_kafe"), []).append(r)
+    result = {}
+    with stage("sentiment"):
+        for id_kafe, items in grouped.items():
+            if id_kafe is None:
+                continue
+            result[str(id_kafe)] = analyze_reviews(items, id_kafe)
+    return jsonify(result), 200
+
 # api cafes
 @app.route('/api/data', methods=['GET'])
 def api_data():
-    return jsonify(get_data()), 200
+    cafes = get_data()
+    # filter fasilitas opsional: /api/data?fasilitas=AC,Toilet&match=all|any
+    wanted = request.args.get("fasilitas")
+    if wanted:
+        match = request.args.get("match", "all").lower()
+        masks = np.fromiter((facility_mask(c.get("fasilitas")) for c in cafes), dtype=np.int64, count=len(cafes))
+        keep = facility_filter(masks, wanted.split(","), match)
+        cafes = [c for c, k in zip(cafes, keep) if k]
+
+    # filter kisaran harga opsional: /api/data?harga_min=20000&harga_max=40000&jenis=makanan|minuman
+    if "harga_min" in request.args or "harga_max" in request.args:
+        field = "harga_minuman" if request.args.get("jenis") == "minuman" else "harga_makanan"
+        lo = parse_price(request.args.get("harga_min")) or 0
+        hi = parse_price(request.args.get("harga_max"))
+        kept = []
+        for c in cafes:
+            c_lo, c_hi = c.get(f"{field}_min"), c.get(f"{field}_max")
+            if c_lo is None or c_hi is None:
+                # kolom numerik belum ada / kosong (migrate_schema.py belum dijalankan): parse teks harga
+                c_lo, c_hi = parse_price_range(c.get(field))
+                if c_lo is None:
+                    continue
+            if c_hi >= lo and (hi is None or c_lo <= hi):
+                kept.append(c)
+        cafes = kept
+    return rows_response(cafes)
 
 @app.route('/api/search/<keyword>', methods=['GET'])
 def api_search(keyword):
@@ -874,7 +1338,7 @@ def api_search(keyword):
 # api menu
 @app.route('/api/menus', methods=['GET'])
 def api_menu():
-    return jsonify(get_menu()), 200
+    return rows_response(get_menu())
 
 @app.route('/api/menu/<int:id_cafe>', methods=['GET'])
 def api_menu_by_id_route(id_cafe):
@@ -897,12 +1361,29 @@ def api_cafe(nomor):
     if request.method == 'PUT':
         data = request.get_json() or {}
         result, status = update_cafe_by_nomor_helper(nomor, data)
+        invalidate_cafe_cache(nomor)
         return jsonify(result), status
 
     if request.method == 'DELETE':
         result, status = delete_cafe_by_nomor_helper(nomor)
+        invalidate_cafe_cache(nomor)
         return jsonify(result), status
 
+# detail beberapa kafe sekaligus: /api/cafes?ids=1,2,3 (urutan mengikuti ids, id yang tidak ada dilewati)
+@app.route('/api/cafes', methods=['GET'])
+def api_cafes_by_ids():
+    parts = [p.strip() for p in request.args.get("ids", "").split(",")]
+    ids = list(dict.fromkeys(int(p) for p in parts if p.lstrip("-").isdigit()))
+    if not ids:
+        return jsonify({"error": "Parameter ids wajib diisi, mis. ?ids=1,2,3"}), 400
+    if len(ids) > MAX_IDS_PER_REQUEST:
+        return jsonify({"error": f"Maksimal {MAX_IDS_PER_REQUEST} id per request"}), 400
+    try:
+        cafes = get_data_by_ids(ids)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return rows_response(cafes)
+
 @app.route('/api/cafe', methods=['POST'])
 def api_create_cafe():
     data = request.get_json(silent=True) or {}
@@ -0,0 +1,200 @@
+# migrate_schema.py
+# Migrasi skema database untuk kolom harga numerik.
+#   - cafe_tables: tambah kolom harga_makanan_min/max & harga_minuman_min/max (INT)
+#     + index, lalu isi dari string "16.000 - 42.000"
+#   - menu_tables: ubah kolom harga menjadi INT (nilai "24.000" -> 24000)
+#   - user_tables: normalisasi harga di menu_yang_disukai menjadi integer
+#   - user_tables: tambah kolom updated_at (+ index) untuk /api/profiles?since=
+#   - user_tables: normalisasi cafe_telah_dikunjungi menjadi [{"id_cafe": N}, ...]
+#     (format lama: nama kafe, string "1,2,3") agar terbaca JSON_TABLE di /api/stats/*
+# Contoh pakai (dari folder src):
+#   python migrate_schema.py
+#   python migrate_schema.py --dry-run
+
+import argparse
+import json
+
+from app import VISIT_ID_KEYS, get_db_connection
+from cafe_common.prices import PRICE_RANGE_FIELDS, parse_price, parse_price_range
+
+
+def existing_columns(cursor, table):
+    cursor.execute(f"SHOW COLUMNS FROM {table}")
+    return {row[0]: str(row[1]).lower() for row in cursor.fetchall()}
+
+
+def migrate_cafe_prices(cursor, dry_run=False):
+    cols = existing_columns(cursor, "cafe_tables")
+    for field in PRICE_RANGE_FIELDS:
+        for suffix in ("min", "max"):
+            name = f"{field}_{suffix}"
+            if name not in cols:
+                print(f"ALTER TABLE cafe_tables ADD COLUMN {name}")
+                if not dry_run:
+                    cursor.execute(f"ALTER TABLE cafe_tables ADD COLUMN {name} INT NULL")
+        if f"{field}_min" not in cols and not dry_run:
+            cursor.execute(f"CREATE INDEX idx_{field}_range ON cafe_tables ({field}_min, {field}_max)")
+
+    cursor.execute(f"SELECT nomor, {', '.join(PRICE_RANGE_FIELDS)} FROM cafe_tables")
+    rows = cursor.fetchall()
+    updated = 0
+    for row in rows:
+        nomor = row[0]
+        values = []
+        for text in row[1:]:
+            values.extend(parse_price_range(text))
+        sets = ", ".join(f"{f}_min = %s, {f}_max = %s" for f in PRICE_RANGE_FIELDS)
+        if not dry_run:
+            cursor.execute(f"UPDATE cafe_tables SET {sets} WHERE nomor = %s", (*values, nomor))
+        updated += 1
+    print(f"cafe_tables: {updated} baris diisi kolom harga numerik")
+
+
+def migrate_menu_prices(cursor, dry_run=False):
+    cols = existing_columns(cursor, "menu_tables")
+    if cols.get("harga", "").startswith("int"):
+        print("menu_tables.harga sudah INT")
+        return
+    cursor.execute("SELECT id_menu, harga FROM menu_tables")
+    rows = cursor.fetchall()
+    for id_menu, harga in rows:
+        if not dry_run:
+            cursor.execute("UPDATE menu_tables SET harga = %s WHERE id_menu = %s", (parse_price(harga), id_menu))
+    print(f"ALTER TABLE menu_tables MODIFY harga INT ({len(rows)} baris)")
+    if not dry_run:
+        cursor.execute("ALTER TABLE menu_tables MODIFY harga INT NULL")
+
+
+def migrate_favorite_prices(cursor, dry_run=False):
+    cursor.execute("SELECT id_user, menu_yang_disukai FROM user_tables")
+    rows = cursor.fetchall()
+    updated = 0
+    for id_user, raw in rows:
+        if not raw:
+            continue
+        try:
+            favs = json.loads(raw) if isinstance(raw, str) else raw
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(favs, list):
+            continue
+        changed = False
+        for m in favs:
+            if isinstance(m, dict) and "harga" in m and not isinstance(m["harga"], int):
+                m["harga"] = parse_price(m["harga"])
+                changed = True
+        if changed:
+            updated += 1
+            if not dry_run:
+                cursor.execute("UPDATE user_tables SET menu_yang_disukai = %s WHERE id_user = %s", (json.dumps(favs), id_user))
+    print(f"user_tables: {updated} pengguna dinormalisasi harga menu favoritnya")
+
+
+VISIT_NAME_KEYS = ("nama_kafe", "name", "nama", "title")
+
+
+# satu item kunjungan -> id kafe (angka, string angka, dict dengan kunci id / nama, atau nama kafe)
+def resolve_visit(item, name_to_id):
+    if isinstance(item, dict):
+        for k in VISIT_ID_KEYS:
+            try:
+                return int(item[k])
+            except (KeyError, ValueError, TypeError):
+                continue
+        names = [item.get(k) for k in VISIT_NAME_KEYS]
+    else:
+        try:
+            return int(str(item).strip())
+        except (ValueError, TypeError):
+            names = [item]
+    for name in names:
+        if isinstance(name, str) and name.strip().lower() in name_to_id:
+            return name_to_id[name.strip().lower()]
+    return None
+
+
+# isi kolom -> (daftar item, apakah sudah berupa JSON list)
+def parse_visits(raw):
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    if not raw:
+        return [], True
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        parsed = raw
+    if isinstance(parsed, list):
+        return parsed, True
+    # "1,2,3" / "62, 17" / satu nilai
+    return [x.strip() for x in str(parsed).split(",") if x.strip()], False
+
+
+def migrate_visited_ids(cursor, dry_run=False):
+    cursor.execute("SELECT nomor, nama_kafe FROM cafe_tables")
+    name_to_id = {}
+    for nomor, nama in cursor.fetchall():
+        if nama and nomor is not None:
+            name_to_id.setdefault(str(nama).strip().lower(), int(nomor))
+
+    cursor.execute("SELECT id_user, cafe_telah_dikunjungi FROM user_tables")
+    rows = cursor.fetchall()
+    updated = unresolved = 0
+    for id_user, raw in rows:
+        items, is_list = parse_visits(raw)
+        changed = not is_list
+        visits = []
+        for item in items:
+            cid = resolve_visit(item, name_to_id)
+            if cid is None:
+                # tidak dikenali: dibiarkan apa adanya (diabaikan oleh pembaca)
+                unresolved += 1
+                visits.append(item)
+                continue
+            rest = {k: v for k, v in item.items() if k not in VISIT_ID_KEYS} if isinstance(item, dict) else {}
+            visit = {"id_cafe": cid, **rest}
+            changed = changed or visit != item
+            visits.append(visit)
+        if changed:
+            updated += 1
+            if not dry_run:
+                cursor.execute("UPDATE user_tables SET cafe_telah_dikunjungi = %s WHERE id_user = %s",
+                               (json.dumps(visits), id_user))
+    print(f"user_tables: {updated} pengguna dinormalisasi riwayat kunjungannya ({unresolved} item tidak dikenali)")
+
+
+def migrate_user_updated_at(cursor, dry_run=False):
+    cols = existing_columns(cursor, "user_tables")
+    if "updated_at" in cols:
+        print("user_tables.updated_at sudah ada")
+        return
+    print("ALTER TABLE user_tables ADD COLUMN updated_at + INDEX idx_user_updated_at")
+    if not dry_run:
+        cursor.execute(
+            "ALTER TABLE user_tables ADD COLUMN updated_at TIMESTAMP NOT NULL "
+            "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+        )
+        cursor.execute("CREATE INDEX idx_user_updated_at ON user_tables (updated_at)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrasi kolom harga numerik, riwayat kunjungan & updated_at pengguna.")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya tampilkan perubahan tanpa menulis ke database")
+    args = parser.parse_args()
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        migrate_cafe_prices(cursor, args.dry_run)
+        migrate_menu_prices(cursor, args.dry_run)
+        migrate_favorite_prices(cursor, args.dry_run)
+        migrate_visited_ids(cursor, args.dry_run)
+        migrate_user_updated_at(cursor, args.dry_run)
+        if not args.dry_run:
+            db.commit()
+    finally:
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,12 @@ pipe = joblib.load(MODEL_FILE)
 
 def analyze_reviews(reviews, id_kafe):
     out = []
-    for r in reviews:
+    if not reviews:
+        return out
+    # prediksi sekaligus untuk semua ulasan
+    labels = pipe.predict([normalize_text(r.get("ulasan","")) for r in reviews])
+    for r, label in zip(reviews, labels):
         text = r.get("ulasan","")
-        clean = normalize_text(text)
-        label = pipe.predict([clean])[0]
         out.append({
             "id_kafe": id_kafe,
             "waktu_ulasan": str(r.get("waktu_ulasan","")),
@@ -8,7 +8,7 @@ import argparse
 import json
 import os
 import sys
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 import requests
 
@@ -34,127 +34,51 @@ def safe_get_json(url: str, timeout: int = 8) -> Any:
         return None
 
 
-def fetch_all_users(base: str) -> List[Dict[str, Any]]:
-    """Ambil semua user dari BASE/api/users (list of dict)."""
-    data = safe_get_json(f"{base.rstrip('/')}/api/users")
-    return data if isinstance(data, list) else []
-
-
-def fetch_cafe(base: str, cid: int) -> Dict[str, Any]:
-    """Ambil detail kafe dari BASE/api/cafe/{id}. Jika tidak ada, coba cari di daftar /api/data."""
-    # coba langsung endpoint detail
-    data = safe_get_json(f"{base.rstrip('/')}/api/cafe/{cid}")
-    if isinstance(data, dict) and data:
-        return data
-
-    # fallback: cari di list /api/data
-    arr = safe_get_json(f"{base.rstrip('/')}/api/data")
-    if isinstance(arr, list):
-        for c in arr:
+def fetch_cafes(base: str, ids: List[int], batch: int = 200) -> Dict[int, Dict[str, Any]]:
+    """Ambil detail banyak kafe sekaligus dari BASE/api/cafes?ids=1,2,3 (satu request per batch)."""
+    ids = list(dict.fromkeys(int(c) for c in ids))
+    found: Dict[int, Dict[str, Any]] = {}
+    for i in range(0, len(ids), batch):
+        chunk = ",".join(str(c) for c in ids[i:i + batch])
+        data = safe_get_json(f"{base.rstrip('/')}/api/cafes?ids={chunk}")
+        for c in data if isinstance(data, list) else []:
             try:
-                # kolom kemungkinan: nomor / id_cafe / id
-                if int(c.get("nomor", c.get("id_cafe", c.get("id", -999)))) == int(cid):
-                    return c
+                found[int(c.get("nomor"))] = c
             except Exception:
                 continue
-    return {}
-
-
-def _normalize_visited_list(raw_vis: Any) -> List[int]:
-    """
-    Normalisasi format 'cafe_telah_dikunjungi' menjadi list[int] id_kafe.
-    Mendukung:
-      - List of dicts: [{"id_cafe": 12, ...}, ...]
-      - JSON string list serupa, atau string "1,2,3"
-      - List of ints (langsung)
-    """
-    out: List[int] = []
-    if raw_vis is None:
-        return out
-
-    # jika sudah list
-    if isinstance(raw_vis, list):
-        items = raw_vis
-    elif isinstance(raw_vis, str):
-        raw = raw_vis.strip()
-        # coba parse json
-        if raw.startswith("[") and raw.endswith("]"):
-            try:
-                parsed = json.loads(raw)
-                items = parsed if isinstance(parsed, list) else []
-            except Exception:
-                items = []
-        else:
-            # fallback: parse "1,2,3"
-            if "," in raw:
-                items = [s.strip() for s in raw.split(",") if s.strip()]
-            else:
-                items = []
-    else:
-        return out
-
-    for it in items:
-        if isinstance(it, dict):
-            # cari field id kafe umum
-            for k in ("id_cafe", "nomor", "cafe_id", "id"):
-                if k in it and it[k] not in (None, ""):
-                    try:
-                        out.append(int(it[k]))
-                    except Exception:
-                        pass
-                    break
-        else:
-            try:
-                out.append(int(it))
-            except Exception:
-                pass
-    return out
+    return found
 
 
-def counts_after_cafe(base: str, source_cafe_id: int) -> List[Tuple[int, int]]:
+def counts_after_cafe(base: str, source_cafe_id: int) -> List[Dict[str, Any]]:
     """
-    Hitung berapa kali setiap kafe muncul sebagai kunjungan segera SETELAH 'source_cafe_id'
-    berdasarkan urutan kunjungan seluruh user (kecuali entri rusak).
-    Return: list tuple (id_kafe_tujuan, jumlah), BELUM ada nama.
+    Hitung berapa kali setiap kafe muncul sebagai kunjungan segera SETELAH 'source_cafe_id'.
+    Agregasi dilakukan backend lewat BASE/api/stats/transitions/{id} (SQL), nama kafe ikut di respons.
+    Return: list dict {id_kafe, nama_kafe, jumlah_kunjungan_setelah}, urut desc jumlah lalu asc id.
     """
     try:
         src = int(source_cafe_id)
     except Exception:
         return []
 
-    users = fetch_all_users(base)
-    counts: Dict[int, int] = {}
-
-    for u in users:
-        # ambil berbagai kemungkinan lokasi field
-        raw = (
-            u.get("cafe_telah_dikunjungi")
-            or u.get("visited")
-            or u.get("cafe_telah_dikunjungi", "[]")
-        )
-        seq = _normalize_visited_list(raw)
-
-        # transisi berurutan (a -> b)
-        for a, b in zip(seq, seq[1:]):
-            try:
-                if int(a) == src:
-                    b = int(b)
-                    counts[b] = counts.get(b, 0) + 1
-            except Exception:
-                continue
-
-    # list & urutkan desc jumlah, lalu asc id
-    return sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+    data = safe_get_json(f"{base.rstrip('/')}/api/stats/transitions/{src}")
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        return []
+    return data["results"]
 
 
-def attach_names(base: str, pairs: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
-    """Lengkapi (id, count) dengan nama kafe dari API."""
+def attach_names(base: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Lengkapi nama kafe yang kosong dari API (satu request bulk untuk semua id yang kurang)."""
+    missing = [r.get("id_kafe") for r in rows if not r.get("nama_kafe") and r.get("id_kafe") is not None]
+    infos = fetch_cafes(base, missing) if missing else {}
     results: List[Dict[str, Any]] = []
-    for cid, cnt in pairs:
-        info = fetch_cafe(base, cid) or {}
-        nama = info.get("nama_kafe") or info.get("nama") or f"Kafe {cid}"
+    for r in rows:
+        cid = r.get("id_kafe")
+        nama = r.get("nama_kafe")
+        if not nama:
+            info = infos.get(cid) or {}
+            nama = info.get("nama_kafe") or info.get("nama") or f"Kafe {cid}"
         results.append(
-            {"id_kafe": cid, "nama_kafe": nama, "jumlah_kunjungan_setelah": int(cnt)}
+            {"id_kafe": cid, "nama_kafe": nama, "jumlah_kunjungan_setelah": int(r.get("jumlah_kunjungan_setelah", 0))}
         )
     return results
 
@@ -199,8 +123,7 @@ def main():
     base = args.base.rstrip("/")
     source_cafe_id = args.cafe
 
-    pairs = counts_after_cafe(base, source_cafe_id)
-    rows = attach_names(base, pairs)
+    rows = attach_names(base, counts_after_cafe(base, source_cafe_id))
 
     if args.format == "json":
         print(json.dumps({"source_cafe_id": source_cafe_id, "results": rows}, ensure_ascii=False, indent=2))
@@ -0,0 +1,114 @@
+# asgi.py
+# Entry point ASGI untuk service rekomendasi (route sama dengan main.py).
+# Contoh pakai:
+#   uvicorn asgi:app --port 8000
+#   python serve_asgi.py --workers 4 --port 8000
+
+import os
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from main import (
+    PROMETHEUS_CONTENT_TYPE,
+    app as flask_app,
+    evaluate_model,
+    get_cf_model,
+    fetch_all_cafes,
+    load_sentiment_cache,
+    parse_recommend_args,
+    recommend_for_user,
+    render_metrics,
+    session,
+    start_sentiment_snapshotter,
+)
+# main sudah menambahkan root repo ke sys.path
+from cafe_common.profiling import profile_mode
+from cafe_common.timing import log_request_timing, observe_request, run_timed, server_timing_header
+
+flask_wsgi = WSGIMiddleware(flask_app)
+
+
+# muat snapshot model sekali sebelum fork worker (dipakai bersama lewat copy-on-write)
+def preload_snapshot():
+    load_sentiment_cache()
+    fetch_all_cafes()
+    mat, _, _ = get_cf_model()
+    # koneksi milik proses master tidak boleh dipakai bersama oleh worker
+    session.close()
+    print(f"Snapshot model dimuat: {len(mat)} pengguna")
+
+
+async def recommend(request):
+    uid = request.path_params["uid"]
+    opts = parse_recommend_args(request.query_params)
+    # skoring bersifat CPU-bound & memakai facade sinkron, jadi dijalankan di threadpool
+    body, stages, total_ms = await run_in_threadpool(run_timed, recommend_for_user, uid, **opts)
+    response = JSONResponse(body)
+    response.headers["Server-Timing"] = server_timing_header(stages, total_ms)
+    response.headers["Timing-Allow-Origin"] = "*"
+    observe_request(request.method, "/api/recommend/{uid:int}", response.status_code, total_ms)
+    log_request_timing(request.method, request.url.path, response.status_code, stages, total_ms)
+    return response
+
+
+async def evaluate(request):
+    body, status = await run_in_threadpool(evaluate_model, request.query_params)
+    return JSONResponse(body, status_code=status)
+
+
+# metrik milik proses worker ini (tiap worker di-scrape terpisah)
+async def metrics(request):
+    return Response(render_metrics(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+# startup per worker (setelah fork): snapshotter sentimen berjalan di tiap proses
+@asynccontextmanager
+async def lifespan(app):
+    start_sentiment_snapshotter()
+    yield
+
+
+# request dengan ?profile= / X-Profile diteruskan ke route Flask yang sama, sehingga hook
+# profiling (cek token, lock, laporan cProfile/tracemalloc) tetap berlaku di mode ASGI
+class ProfiledViaFlask:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if profile_mode(request.query_params, request.headers) is not None:
+            await flask_wsgi(scope, receive, send)
+            return
+        response = await self.endpoint(request)
+        await response(scope, receive, send)
+
+
+# jalur panas ditangani langsung; route Flask lainnya (invalidasi cache, statistik, warmup,
+# near, similar, fasilitas, kisaran harga, ...) diteruskan ke aplikasi Flask lewat WSGI
+routes = [
+    Route("/api/recommend/{uid:int}", ProfiledViaFlask(recommend)),
+    Route("/api/evaluate", ProfiledViaFlask(evaluate)),
+    Route("/metrics", metrics),
+    Mount("/", app=flask_wsgi),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if os.environ.get("UBCF_PRELOAD", "1") == "1":
+    preload_snapshot()
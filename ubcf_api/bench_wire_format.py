@@ -0,0 +1,95 @@
+# bench_wire_format.py
+# Bandingkan ukuran payload & waktu parse JSON vs msgpack kolumnar
+# untuk endpoint bulk /api/users, /api/data dan /api/menus,
+# serta /api/users (+ json.loads per kolom) vs profil ringkas /api/profiles.
+# Contoh pakai:
+#   python bench_wire_format.py --base http://127.0.0.1:8080 --repeat 20
+
+import argparse
+import json
+import statistics
+import time
+
+import msgpack
+import requests
+
+from data_source import COLUMNAR_MIMETYPE, decode_columnar, profile_to_user
+
+ENDPOINTS = ["/api/users", "/api/data", "/api/menus"]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark format JSON vs msgpack kolumnar.")
+    parser.add_argument("--base", default="http://127.0.0.1:8080")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    base = args.base.rstrip("/")
+
+    print(f"{'Endpoint':<12} {'Baris':>6} {'JSON (B)':>10} {'msgpack (B)':>12} {'Rasio':>6} {'JSON ms':>8} {'msgpack ms':>11}")
+    for ep in ENDPOINTS:
+        r_json = requests.get(base + ep, headers={"Accept": "application/json"}, timeout=30)
+        r_mp = requests.get(base + ep, headers={"Accept": COLUMNAR_MIMETYPE}, timeout=30)
+        if COLUMNAR_MIMETYPE not in r_mp.headers.get("Content-Type", ""):
+            print(f"{ep:<12} server belum mendukung {COLUMNAR_MIMETYPE}")
+            continue
+
+        body_json = r_json.content
+        body_mp = r_mp.content
+        rows = len(json.loads(body_json))
+
+        # JSON -> list of dict; msgpack -> array NumPy per kolom (+ list of dict)
+        t_json = timed(lambda: json.loads(body_json), args.repeat)
+        t_mp = timed(lambda: decode_columnar(msgpack.unpackb(body_mp, raw=False)), args.repeat)
+
+        ratio = len(body_mp) / len(body_json) if body_json else 0.0
+        print(f"{ep:<12} {rows:>6} {len(body_json):>10} {len(body_mp):>12} {ratio:>6.2f} {t_json:>8.2f} {t_mp:>11.2f}")
+
+    bench_profiles(base, args.repeat)
+
+
+# /api/users: baris penuh + kolom JSON diparse per pengguna; /api/profiles: array siap pakai
+def parse_users(body):
+    users = json.loads(body)
+    for u in users:
+        for k in ("cafe_telah_dikunjungi", "menu_yang_disukai"):
+            if isinstance(u.get(k), str):
+                try:
+                    u[k] = json.loads(u[k])
+                except ValueError:
+                    u[k] = []
+    return users
+
+
+def parse_profiles(body):
+    data = json.loads(body)
+    menus = data.get("menus") or []
+    return [profile_to_user(p, menus) for p in data.get("profiles") or []]
+
+
+def bench_profiles(base, repeat):
+    r_users = requests.get(base + "/api/users", headers={"Accept": "application/json"}, timeout=30)
+    r_prof = requests.get(base + "/api/profiles", timeout=30)
+    if r_prof.status_code != 200:
+        print("/api/profiles belum tersedia di server")
+        return
+    t_users = timed(lambda: parse_users(r_users.content), repeat)
+    t_prof = timed(lambda: parse_profiles(r_prof.content), repeat)
+    print()
+    print(f"{'Pengguna':<14} {'Bytes':>10} {'Parse ms':>9}")
+    print(f"{'/api/users':<14} {len(r_users.content):>10} {t_users:>9.2f}")
+    print(f"{'/api/profiles':<14} {len(r_prof.content):>10} {t_prof:>9.2f}")
+    if r_prof.content and t_prof:
+        print(f"Rasio ukuran {len(r_users.content) / len(r_prof.content):.1f}x, parse {t_users / t_prof:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,11 @@ try:
         robust_normalize_scores,
         normalize_number,
         compute_sentiment_for_cafe,
-        fetch_cafe,
+        fetch_cafes,
         fetch_visited,
         _normalize_visited_list,
         build_candidate_pool_from_signals,
+        prefetch_sentiments,
         invalidate_caches
     )
 except ImportError as e:
@@ -55,9 +56,13 @@ co_norm = robust_normalize_scores(co_counts, pct=95)
 
 w_cf = 0.5; w_vf = 0.2; w_co =0.2; w_sent_and_rate = 0.1
 
+# sentimen & detail seluruh kandidat diambil sekaligus sebelum loop skoring
+prefetch_sentiments(pool)
+infos = fetch_cafes(pool)
+
 rows = []
 for cid in pool:
-    info = fetch_cafe(cid) or {}
+    info = infos.get(int(cid)) or {}
     cf_s = cf_norm.get(cid, 0.0)
     vf_s = vf_norm.get(cid, 0.0)
     co_s = co_norm.get(cid, 0.0)
@@ -0,0 +1,312 @@
+# data_source.py
+# Sumber data untuk service rekomendasi. Dipilih lewat env UBCF_DATA_SOURCE:
+#   http (default) -> lewat REST API src/app.py (pengguna dari /api/profiles, inkremental)
+#   db             -> baca langsung dari MySQL dengan SELECT kolom yang dibutuhkan saja
+# Skor sentimen tetap lewat HTTP karena model klasifikasinya ada di service src/app.py.
+
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNAR_MIMETYPE = "application/x-msgpack"
+# Accept untuk endpoint bulk: msgpack kolumnar bila tersedia, JSON sebagai cadangan
+BULK_ACCEPT = f"{COLUMNAR_MIMETYPE}, application/json;q=0.5" if msgpack is not None else "application/json"
+# jumlah id per request /api/cafes (batas backend 500)
+CAFES_BATCH = 200
+# jumlah koneksi MySQL per proses untuk UBCF_DATA_SOURCE=db
+DB_POOL_SIZE = int(os.environ.get("UBCF_DB_POOL_SIZE", 8))
+# detik sebelum skema cafe_tables dicek ulang selama kolom harga numerik belum lengkap
+CAFE_COLUMNS_RECHECK = 300
+
+
+# list of dict biasa + atribut .columns berisi array NumPy per kolom
+class ColumnarRows(list):
+    columns = None
+
+
+def _column_array(values):
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return np.asarray(values, dtype=np.float64 if any(isinstance(v, float) for v in values) else np.int64)
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def decode_columnar(payload):
+    columns = payload.get("columns") or []
+    data = payload.get("data") or []
+    rows = ColumnarRows(dict(zip(columns, row)) for row in zip(*data))
+    rows.columns = {c: _column_array(vals) for c, vals in zip(columns, data)}
+    return rows
+
+
+def columns_of(rows, names):
+    cols = getattr(rows, "columns", None)
+    if cols is not None and all(n in cols for n in names):
+        return {n: cols[n] for n in names}
+    return {n: _column_array([r.get(n) for r in rows]) for n in names}
+
+
+PROFILE_PREFERENCES = ("preferensi_jarak_minimal", "preferensi_jarak_maksimal", "preferensi_fasilitas")
+
+
+# profil ringkas /api/profiles -> dict pengguna berbentuk sama dengan baris /api/users
+# (kunjungan & menu favorit sudah berupa list, tidak perlu json.loads lagi)
+def profile_to_user(p, menus):
+    favs = []
+    for cid, mid, harga in zip(p.get("fav_cafe") or [], p.get("fav_menu") or [], p.get("fav_harga") or []):
+        fav = {"id_cafe": cid, "nama_menu": menus[mid] if 0 <= mid < len(menus) else ""}
+        if harga is not None:
+            fav["harga"] = harga
+        favs.append(fav)
+    user = {"id_user": p["id_user"], "cafe_telah_dikunjungi": list(p.get("visits") or []), "menu_yang_disukai": favs}
+    for k in PROFILE_PREFERENCES:
+        if k in p:
+            user[k] = p[k]
+    return user
+
+
+class HttpDataSource:
+    name = "http"
+
+    def __init__(self, base, get, get_many):
+        self.base = base.rstrip("/")
+        self.get = get
+        self.get_many = get_many
+        self._profiles = {}
+        self._profile_list = None
+        self._since = None
+        self._profiles_lock = threading.Lock()
+        self._previous = {}
+
+    # daftar pengguna dari /api/profiles; setelah pengambilan pertama hanya profil yang berubah
+    # (?since=) yang diambil. Bila tidak ada perubahan, objek list yang sama dikembalikan
+    # sehingga snapshot model tidak perlu dibangun ulang.
+    def users(self, deadline=None):
+        with self._profiles_lock:
+            since = self._since
+        url = f"{self.base}/api/profiles" + (f"?since={since}" if since is not None else "")
+        data = self.get(url, deadline=deadline)
+        if not isinstance(data, dict) or not isinstance(data.get("profiles"), list):
+            # backend lama tanpa /api/profiles
+            return self._unchanged("users", self.get(f"{self.base}/api/users", deadline=deadline, accept=BULK_ACCEPT))
+        return self._merge_profiles(data)
+
+    # isi sama dengan pengambilan sebelumnya -> objek list lama dikembalikan, sehingga versi cache
+    # pengguna tidak naik dan snapshot model yang dibangun dari list tersebut tetap dipakai
+    def _unchanged(self, name, rows):
+        if not isinstance(rows, list):
+            return rows
+        with self._profiles_lock:
+            prev = self._previous.get(name)
+            if prev is not None and prev == rows:
+                return prev
+            self._previous[name] = rows
+            return rows
+
+    # lupakan status inkremental; pengambilan berikutnya mengunduh semua profil
+    def reset(self):
+        with self._profiles_lock:
+            self._profiles = {}
+            self._profile_list = None
+            self._since = None
+            self._previous = {}
+
+    def _merge_profiles(self, data):
+        menus = data.get("menus") or []
+        fresh = {}
+        for p in data["profiles"]:
+            try:
+                fresh[int(p["id_user"])] = profile_to_user(p, menus)
+            except (KeyError, ValueError, TypeError):
+                continue
+        with self._profiles_lock:
+            if data.get("full") or self._profile_list is None:
+                profiles = fresh
+            else:
+                profiles = dict(self._profiles)
+                profiles.update(fresh)
+                alive = data.get("all_ids")
+                if alive is not None:
+                    alive = set(alive)
+                    profiles = {uid: u for uid, u in profiles.items() if uid in alive}
+            self._since = data.get("server_time")
+            if self._profile_list is not None and profiles == self._profiles:
+                return self._profile_list
+            self._profiles = profiles
+            self._profile_list = list(profiles.values())
+            return self._profile_list
+
+    def cafes(self, deadline=None):
+        return self._unchanged("cafes", self.get(f"{self.base}/api/data", deadline=deadline, accept=BULK_ACCEPT))
+
+    def user(self, uid, deadline=None):
+        return self.get(f"{self.base}/api/users/{uid}", deadline=deadline)
+
+    def cafe(self, cid, deadline=None):
+        return self.get(f"{self.base}/api/cafe/{cid}", deadline=deadline)
+
+    # detail kafe lewat /api/cafes?ids=..., satu request per CAFES_BATCH id (batch dikirim paralel)
+    def cafes_by_ids(self, cids, deadline=None):
+        cids = list(dict.fromkeys(int(c) for c in cids))
+        batches = [cids[i:i + CAFES_BATCH] for i in range(0, len(cids), CAFES_BATCH)]
+        if not batches:
+            return {}
+        if len(batches) == 1:
+            results = [self.get(f"{self.base}/api/cafes?ids={','.join(map(str, batches[0]))}", deadline=deadline)]
+        else:
+            results = self.get_many([f"{self.base}/api/cafes?ids={','.join(map(str, b))}" for b in batches], deadline)
+        found = {}
+        for rows in results:
+            for row in rows if isinstance(rows, list) else []:
+                try:
+                    found[int(row["nomor"])] = row
+                except (KeyError, ValueError, TypeError):
+                    continue
+        return found
+
+    def sentiment(self, cid, deadline=None):
+        return self.get(f"{self.base}/api/sentiment/{cid}", deadline=deadline)
+
+    def sentiments(self, cids, deadline=None):
+        return self.get_many([f"{self.base}/api/sentiment/{cid}" for cid in cids], deadline)
+
+    def all_sentiments(self):
+        return self.get(f"{self.base}/api/sentiments", timeout=60)
+
+
+class DbDataSource(HttpDataSource):
+    name = "db"
+
+    USER_COLUMNS = (
+        "id_user", "cafe_telah_dikunjungi", "menu_yang_disukai",
+        "preferensi_jarak_minimal", "preferensi_jarak_maksimal", "preferensi_fasilitas",
+    )
+    CAFE_COLUMNS = (
+        "nomor", "nama_kafe", "alamat", "rating", "latitude", "longitude", "desain", "fasilitas",
+        "harga_makanan", "harga_minuman",
+    )
+    # kolom hasil src/migrate_schema.py; database yang belum dimigrasi cukup memakai string harga
+    PRICE_COLUMNS = ("harga_makanan_min", "harga_makanan_max", "harga_minuman_min", "harga_minuman_max")
+
+    def __init__(self, db_config, base, get, get_many):
+        super().__init__(base, get, get_many)
+        self.db_config = db_config
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._cafe_columns = None
+
+    # pool koneksi dibuat saat pertama dipakai, satu per proses (koneksi tidak boleh ikut ter-fork)
+    def _connection(self):
+        import mysql.connector
+        from mysql.connector import pooling
+
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name=f"ubcf-{os.getpid()}", pool_size=DB_POOL_SIZE, **self.db_config)
+                self._pool_pid = os.getpid()
+            pool = self._pool
+        try:
+            return pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            # pool sedang habis: koneksi langsung di luar pool untuk query ini
+            return mysql.connector.connect(**self.db_config)
+
+    def _query(self, query, params=(), deadline=None):
+        import mysql.connector
+
+        if deadline is not None and deadline.expired():
+            deadline.mark_truncated()
+            return None
+        db = None
+        try:
+            db = self._connection()
+            cursor = db.cursor()
+            # batas eksekusi query dari sisa budget (connection_timeout hanya membatasi connect);
+            # server tanpa max_execution_time (mis. MariaDB) tetap dijalankan tanpa batas
+            remaining = deadline.remaining() if deadline is not None else None
+            if remaining is not None:
+                try:
+                    cursor.execute("SET SESSION max_execution_time = %s", (max(1, int(remaining * 1000)),))
+                except mysql.connector.Error:
+                    pass
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        except mysql.connector.Error as e:
+            if deadline is not None:
+                deadline.mark_error()
+            print(f"Error query database: {e}")
+            return None
+        finally:
+            # koneksi pool dikembalikan (session di-reset), koneksi langsung ditutup
+            if db is not None:
+                db.close()
+
+    def _select(self, table, columns, where="", params=(), deadline=None):
+        rows = self._query(f"SELECT {', '.join(columns)} FROM {table} {where}", params, deadline)
+        if rows is None:
+            return None
+        return [dict(zip(columns, row)) for row in rows]
+
+    # kolom kafe yang dipilih; kolom harga numerik hanya jika sudah ada.
+    # selama migrasi belum lengkap skema dicek ulang tiap CAFE_COLUMNS_RECHECK detik
+    def cafe_columns(self, deadline=None):
+        cached = self._cafe_columns
+        if cached is not None and (len(cached[1]) == len(self.CAFE_COLUMNS) + len(self.PRICE_COLUMNS)
+                                   or time.time() - cached[0] < CAFE_COLUMNS_RECHECK):
+            return cached[1]
+        rows = self._query("SHOW COLUMNS FROM cafe_tables", deadline=deadline)
+        if rows is None:
+            return cached[1] if cached is not None else self.CAFE_COLUMNS
+        existing = {row[0] for row in rows}
+        columns = self.CAFE_COLUMNS + tuple(c for c in self.PRICE_COLUMNS if c in existing)
+        self._cafe_columns = (time.time(), columns)
+        return columns
+
+    def users(self, deadline=None):
+        return self._unchanged("users", self._select("user_tables", self.USER_COLUMNS, deadline=deadline))
+
+    def cafes(self, deadline=None):
+        return self._unchanged("cafes", self._select("cafe_tables", self.cafe_columns(deadline), deadline=deadline))
+
+    def user(self, uid, deadline=None):
+        rows = self._select("user_tables", self.USER_COLUMNS, "WHERE id_user = %s", (uid,), deadline)
+        return rows[0] if rows else None
+
+    def cafe(self, cid, deadline=None):
+        rows = self._select("cafe_tables", self.cafe_columns(deadline), "WHERE nomor = %s", (cid,), deadline)
+        return rows[0] if rows else None
+
+    def cafes_by_ids(self, cids, deadline=None):
+        cids = [int(c) for c in cids]
+        if not cids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(cids))
+        rows = self._select("cafe_tables", self.cafe_columns(deadline), f"WHERE nomor IN ({placeholders})", tuple(cids), deadline)
+        return {int(r["nomor"]): r for r in rows or []}
+
+
+def make_data_source(base, get, get_many):
+    kind = os.environ.get("UBCF_DATA_SOURCE", "http").strip().lower()
+    if kind == "db":
+        db_config = {
+            "host": os.environ.get("UBCF_DB_HOST", "localhost"),
+            "user": os.environ.get("UBCF_DB_USER", "root"),
+            "password": os.environ.get("UBCF_DB_PASSWORD", ""),
+            "database": os.environ.get("UBCF_DB_NAME", "cafe_databases"),
+        }
+        return DbDataSource(db_config, base, get, get_many)
+    return HttpDataSource(base, get, get_many)
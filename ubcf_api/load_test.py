@@ -0,0 +1,89 @@
+# load_test.py
+# Uji beban sederhana untuk membandingkan throughput server Flask (main.py)
+# dengan mode ASGI multi-worker (serve_asgi.py) pada klien konkuren.
+# Contoh pakai:
+#   python main.py                                  # port 5000
+#   python serve_asgi.py --workers 4 --port 8000
+#   python load_test.py --url http://127.0.0.1:5000 --url http://127.0.0.1:8000 --uids 1,2,3 --concurrency 32
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+
+def run_load(base, uids, concurrency, duration, params):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(worker_id):
+        sess = requests.Session()
+        i = worker_id
+        while time.perf_counter() < stop_at:
+            uid = uids[i % len(uids)]
+            i += concurrency
+            t0 = time.perf_counter()
+            try:
+                r = sess.get(f"{base}/api/recommend/{uid}", params=params, timeout=30)
+                ok = r.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            dt = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies.append(dt)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    lat_ms = sorted(x * 1000.0 for x in latencies)
+
+    def pct(p):
+        if not lat_ms:
+            return 0.0
+        return lat_ms[min(len(lat_ms) - 1, int(round(p / 100.0 * (len(lat_ms) - 1))))]
+
+    return {
+        "url": base,
+        "requests": len(lat_ms),
+        "errors": errors[0],
+        "rps": len(lat_ms) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": statistics.mean(lat_ms) if lat_ms else 0.0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uji beban endpoint /api/recommend/<uid>.")
+    parser.add_argument("--url", action="append", required=True, help="Base URL server (boleh lebih dari satu)")
+    parser.add_argument("--uids", default="1", help="Daftar uid dipisah koma, mis. 1,2,3")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="Durasi per server (detik)")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    uids = [int(x) for x in args.uids.split(",") if x.strip()]
+    params = {"budget_ms": args.budget_ms} if args.budget_ms else {}
+
+    print(f"{'Server':<32} {'Req':>7} {'Err':>5} {'Req/s':>8} {'Mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for base in args.url:
+        r = run_load(base.rstrip("/"), uids, args.concurrency, args.duration, params)
+        print(f"{r['url']:<32} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['mean_ms']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,42 @@
 # main.py
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import requests
 import pandas as pd
 import numpy as np
 import json
-from sklearn.neighbors import NearestNeighbors
-from collections import defaultdict
+from sklearn.neighbors import NearestNeighbors, BallTree
+from scipy.sparse import csr_matrix
+from collections import defaultdict, OrderedDict
+import heapq
+import threading
 import time
 import math
+import os
 import random
+import sys
+import sqlite3
+import atexit
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# modul bersama (cafe_common) ada di root repo
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+
+from data_source import make_data_source, decode_columnar, columns_of, msgpack
+from cafe_common.facilities import facility_filter, facility_mask, facility_names, parse_facilities
+from cafe_common.prices import PRICE_RANGE_FIELDS, parse_price, parse_price_range
+from cafe_common.metrics import PROMETHEUS_CONTENT_TYPE, TIMING_BUCKETS_MS, Counters, prom_histogram, prom_metric
+from cafe_common.timing import init_request_timing, request_counts, request_latency, stage, stage_stats, timed
+from cafe_common.profiling import Profiler, init_profiling, profile_authorized, profile_lock
 
 app = Flask(__name__)
 CORS(app)
@@ -17,83 +44,427 @@ CORS(app)
 BASE = "http://127.0.0.1:8080"
 BASE = BASE.rstrip("/")
 
+# ukuran pool koneksi & batas panggilan paralel ke backend
+HTTP_POOL_SIZE = 32
+FETCH_CONCURRENCY = 16
+
 session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+session.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
 DEFAULT_TIMEOUT = 6 
 
 CACHE_TTL = 2 
-_cafes_cache = {"ts": 0, "data": None}
-_users_cache = {"ts": 0, "data": None}
+# data lama masih boleh disajikan sambil di-refresh di latar (stale-while-revalidate)
+STALE_TTL = 30
+_cafes_cache = {"name": "cafes", "ts": 0, "data": None, "lock": threading.Lock(), "inflight": None}
+_users_cache = {"name": "users", "ts": 0, "data": None, "version": 0, "lock": threading.Lock(), "inflight": None}
 
 def now_ts():
     return time.time()
 
+def expire_cache(cache, drop_data=False):
+    with cache["lock"]:
+        cache["ts"] = 0
+        if drop_data:
+            cache["data"] = None
+
 def invalidate_caches(clear_sentiment=False):
-    _cafes_cache["data"] = None
-    _cafes_cache["ts"] = 0
-    _users_cache["data"] = None
-    _users_cache["ts"] = 0
+    expire_cache(_cafes_cache, drop_data=True)
+    expire_cache(_users_cache, drop_data=True)
+    source.reset()
+    _result_cache.clear()
     if clear_sentiment:
         _sentiment_cache.clear()
 
-def safe_get(url, timeout=DEFAULT_TIMEOUT):
+# PENGUKURAN WAKTU PER TAHAP (cafe_common.timing)
+# durasi tiap tahap (fetch, build model, KNN, sentimen, ranking, ...) dicatat ke request yang
+# sedang berjalan (header Server-Timing + satu baris log JSON) dan ke histogram agregat per tahap
+TIMING_LOG = os.environ.get("UBCF_TIMING_LOG", "1") == "1"
+init_request_timing(app, log=TIMING_LOG)
+
+# metrik operasional untuk /metrics (lookup cache, panggilan backend)
+_cache_counts = Counters()
+_backend_calls = Counters()
+
+# PROFILING ON-DEMAND (khusus admin, cafe_common.profiling)
+# ?profile=1|cpu|mem dengan header X-Profile-Token = UBCF_PROFILE_TOKEN; hasil disimpan di UBCF_PROFILE_DIR
+PROFILE_TOKEN = os.environ.get("UBCF_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("UBCF_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+init_profiling(app, PROFILE_TOKEN, PROFILE_DIR)
+
+# batas waktu per request (budget_ms), diteruskan ke semua fetch & tahap skoring
+class Deadline:
+    def __init__(self, budget_ms=None):
+        self.expires_at = None if budget_ms is None else now_ts() + budget_ms / 1000.0
+        # jumlah fetch yang dilewati / terpotong karena budget habis, dan yang gagal di backend
+        self.truncated = 0
+        self.failed = 0
+
+    def mark_truncated(self):
+        self.truncated += 1
+
+    def mark_failed(self):
+        self.failed += 1
+
+    # error setelah budget habis dihitung terpotong, selain itu kegagalan backend
+    def mark_error(self):
+        if self.expired():
+            self.truncated += 1
+        else:
+            self.failed += 1
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - now_ts())
+
+    def expired(self):
+        return self.expires_at is not None and now_ts() >= self.expires_at
+
+    def timeout(self, default=DEFAULT_TIMEOUT):
+        rem = self.remaining()
+        return default if rem is None else min(default, rem)
+
+@timed("backend_http")
+def safe_get(url, timeout=DEFAULT_TIMEOUT, deadline=None, accept=None):
+    if deadline is not None:
+        if deadline.expired():
+            _backend_calls.inc(("sync", "skipped"))
+            deadline.mark_truncated()
+            return None
+        timeout = deadline.timeout(timeout)
     try:
-        r = session.get(url, timeout=timeout)
+        headers = {"Accept": accept} if accept else None
+        r = session.get(url, timeout=timeout, headers=headers)
         r.raise_for_status()
-        return r.json()
+        # respons kolumnar (msgpack) langsung dijadikan array NumPy per kolom
+        if msgpack is not None and "msgpack" in r.headers.get("Content-Type", ""):
+            data = decode_columnar(msgpack.unpackb(r.content, raw=False))
+        else:
+            data = r.json()
+        _backend_calls.inc(("sync", "ok"))
+        return data
     except requests.exceptions.RequestException as e:
+        _backend_calls.inc(("sync", "error"))
+        if deadline is not None:
+            deadline.mark_error()
         print(f"Error saat mengambil data dari {url}: {e}")
         return None
     except json.JSONDecodeError:
+        _backend_calls.inc(("sync", "invalid"))
+        if deadline is not None:
+            deadline.mark_failed()
         print(f"Error: Respons dari {url} bukan JSON valid.")
         return None
+    except ValueError:
+        _backend_calls.inc(("sync", "invalid"))
+        if deadline is not None:
+            deadline.mark_failed()
+        print(f"Error: Respons dari {url} bukan msgpack valid.")
+        return None
 
-# FETCH DATA dari API
-def fetch_all_cafes(force=False):
-    if not force and _cafes_cache["data"] is not None and (now_ts() - _cafes_cache["ts"] < CACHE_TTL):
-        return _cafes_cache["data"]
-    data = safe_get(f"{BASE}/api/data")
-    if isinstance(data, list):
-        _cafes_cache["data"] = data
-        _cafes_cache["ts"] = now_ts()
+# cache LRU berukuran terbatas dengan TTL opsional (aman dipakai dari banyak thread)
+class LRUCache:
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            ent = self._data.get(key)
+            if ent is not None:
+                ts, value = ent
+                if self.ttl is None or now_ts() - ts <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ts=None):
+        with self._lock:
+            self._data[key] = (now_ts() if ts is None else ts, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def items(self):
+        with self._lock:
+            return [(k, ts, v) for k, (ts, v) in self._data.items()]
+
+    def pop_where(self, pred):
+        with self._lock:
+            keys = [k for k in self._data if pred(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+# cache hasil rekomendasi per pengguna, key = (uid, versi model, versi data pengguna, parameter).
+# hasil juga bergantung pada kunjungan & favorit pengguna lain, jadi key ikut versi snapshot pengguna
+# dan entri kedaluwarsa setelah RESULT_CACHE_TTL detik
+MODEL_VERSION = "ubcf-1"
+RESULT_CACHE_MAX = 1024
+RESULT_CACHE_TTL = 5 * 60
+_result_cache = LRUCache(max_size=RESULT_CACHE_MAX, ttl=RESULT_CACHE_TTL)
+
+# INVALIDASI LINTAS PROSES
+# waktu invalidasi terakhir per pengguna disimpan di file SQLite bersama, sehingga
+# POST /api/cache/invalidate yang diterima satu worker ASGI juga berlaku di worker lain
+INVALIDATION_FILE = os.environ.get(
+    "UBCF_INVALIDATION_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "invalidations.sqlite"),
+)
+_invalidation_local = threading.local()
+
+# satu koneksi per thread (dan per proses: koneksi tidak boleh terbawa ke proses hasil fork)
+def _invalidation_conn():
+    conn = getattr(_invalidation_local, "conn", None)
+    if conn is None or _invalidation_local.pid != os.getpid():
+        conn = sqlite3.connect(INVALIDATION_FILE, timeout=1, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS invalidations (uid INTEGER PRIMARY KEY, ts REAL)")
+        _invalidation_local.conn = conn
+        _invalidation_local.pid = os.getpid()
+    return conn
+
+def mark_invalidated(uid, ts=None):
+    ts = now_ts() if ts is None else ts
+    try:
+        _invalidation_conn().execute(
+            "INSERT INTO invalidations (uid, ts) VALUES (?, ?) ON CONFLICT(uid) DO UPDATE SET ts = excluded.ts",
+            (int(uid), ts))
+    except sqlite3.Error as e:
+        print(f"Gagal mencatat invalidasi pengguna {uid}: {e}")
+    return ts
+
+# 0.0 bila pengguna belum pernah diinvalidasi
+def invalidated_at(uid):
+    try:
+        row = _invalidation_conn().execute("SELECT ts FROM invalidations WHERE uid = ?", (int(uid),)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Gagal membaca invalidasi pengguna {uid}: {e}")
+        return 0.0
+    return row[0] if row else 0.0
+
+# FETCH PARALEL (asyncio fan-out)
+# dipakai langsung oleh handler async, atau lewat fetch_many() dari kode sinkron
+def new_async_client():
+    limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+    return httpx.AsyncClient(limits=limits, timeout=DEFAULT_TIMEOUT)
+
+async def _async_get_json(client, sem, url, deadline=None):
+    async with sem:
+        if deadline is not None and deadline.expired():
+            _backend_calls.inc(("async", "skipped"))
+            deadline.mark_truncated()
+            return None
+        timeout = deadline.timeout() if deadline is not None else DEFAULT_TIMEOUT
+        try:
+            r = await client.get(url, timeout=timeout)
+            r.raise_for_status()
+            data = r.json()
+            _backend_calls.inc(("async", "ok"))
+            return data
+        except httpx.HTTPError as e:
+            _backend_calls.inc(("async", "error"))
+            if deadline is not None:
+                deadline.mark_error()
+            print(f"Error saat mengambil data dari {url}: {e}")
+            return None
+        except json.JSONDecodeError:
+            _backend_calls.inc(("async", "invalid"))
+            if deadline is not None:
+                deadline.mark_failed()
+            print(f"Error: Respons dari {url} bukan JSON valid.")
+            return None
+
+async def fetch_many_async(urls, client, deadline=None, concurrency=FETCH_CONCURRENCY):
+    sem = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(_async_get_json(client, sem, u, deadline) for u in urls))
+
+# event loop latar + client async yang dipakai bersama oleh semua thread Flask
+_async_backend = {"loop": None, "client": None, "lock": threading.Lock()}
+
+def _get_async_backend():
+    with _async_backend["lock"]:
+        if _async_backend["loop"] is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ubcf-async-fetch", daemon=True).start()
+            async def make_client():
+                return new_async_client()
+            _async_backend["client"] = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+            _async_backend["loop"] = loop
+        return _async_backend["loop"], _async_backend["client"]
+
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="ubcf-fetch")
+
+# facade sinkron: hasil berurutan sesuai urls, None untuk yang gagal
+@timed("backend_fetch_many")
+def fetch_many(urls, deadline=None):
+    urls = list(urls)
+    if not urls:
+        return []
+    if httpx is None:
+        # fallback tanpa httpx: thread pool di atas session requests
+        return list(_fetch_pool.map(lambda u: safe_get(u, deadline=deadline), urls))
+    loop, client = _get_async_backend()
+    fut = asyncio.run_coroutine_threadsafe(fetch_many_async(urls, client, deadline), loop)
+    remaining = deadline.remaining() if deadline is not None else None
+    try:
+        return fut.result(timeout=remaining + 0.5 if remaining is not None else None)
+    except Exception as e:
+        fut.cancel()
+        if deadline is not None:
+            deadline.mark_error()
+        print(f"Error saat fetch paralel: {e}")
+        return [None] * len(urls)
+
+# sumber data (http / db), dipilih lewat env UBCF_DATA_SOURCE
+source = make_data_source(BASE, safe_get, fetch_many)
+
+# refresh satu resource; hanya dijalankan oleh pemegang slot "inflight"
+def _refresh_cache(cache, loader, deadline=None):
+    try:
+        data = loader(deadline)
+        if isinstance(data, list):
+            with cache["lock"]:
+                # versi naik hanya bila isinya berganti (sumber inkremental mengembalikan list yang sama)
+                if data is not cache["data"]:
+                    cache["version"] = cache.get("version", 0) + 1
+                cache["data"] = data
+                cache["ts"] = now_ts()
+    finally:
+        with cache["lock"]:
+            ev = cache["inflight"]
+            cache["inflight"] = None
+        if ev is not None:
+            ev.set()
+
+# single-flight: hanya satu refresh per resource, request lain menunggu hasil yang sama
+def _fetch_cached(cache, loader, force=False, deadline=None):
+    with cache["lock"]:
+        data = cache["data"]
+        age = now_ts() - cache["ts"]
+        if data is not None and (cache.get("frozen") or (not force and age < CACHE_TTL)):
+            _cache_counts.inc((cache["name"], "hit"))
+            return data
+        ev = cache["inflight"]
+        leader = ev is None
+        if leader:
+            ev = cache["inflight"] = threading.Event()
+
+    # salinan yang masih cukup baru langsung disajikan, refresh berjalan di latar
+    if not force and data is not None and age < STALE_TTL:
+        _cache_counts.inc((cache["name"], "stale"))
+        if leader:
+            threading.Thread(target=_refresh_cache, args=(cache, loader), daemon=True).start()
         return data
-    return _cafes_cache["data"] or []
 
-def fetch_all_users(force=False):
-    if not force and _users_cache["data"] is not None and (now_ts() - _users_cache["ts"] < CACHE_TTL):
-        return _users_cache["data"]
-    data = safe_get(f"{BASE}/api/users")
-    if isinstance(data, list):
-        _users_cache["data"] = data
-        _users_cache["ts"] = now_ts()
-        return data
-    return _users_cache["data"] or []
+    _cache_counts.inc((cache["name"], "miss"))
+    if leader:
+        _refresh_cache(cache, loader, deadline)
+    elif not ev.wait(deadline.timeout() if deadline is not None else DEFAULT_TIMEOUT) and deadline is not None:
+        deadline.mark_truncated()
+    with cache["lock"]:
+        return cache["data"] or []
+
+# bekukan data pengguna & kafe yang sudah dimuat: tidak ada refresh lagi di proses ini
+# (dipakai job batch agar semua worker hasil fork memakai snapshot yang sama)
+def freeze_caches():
+    for cache in (_cafes_cache, _users_cache):
+        with cache["lock"]:
+            cache["frozen"] = cache["data"] is not None
 
-def fetch_cafe(cid):
-    cafes = fetch_all_cafes()
-    if cafes:
-        for c in cafes:
-            try:
-                if int(c.get("nomor", c.get("id_cafe", c.get("id", -999)))) == int(cid):
-                    return c
-            except (ValueError, TypeError):
-                continue
-    data = safe_get(f"{BASE}/api/cafe/{cid}")
+# FETCH DATA dari API
+@timed("fetch_cafes")
+def fetch_all_cafes(force=False, deadline=None):
+    return _fetch_cached(_cafes_cache, source.cafes, force, deadline)
+
+@timed("fetch_users")
+def fetch_all_users(force=False, deadline=None):
+    return _fetch_cached(_users_cache, source.users, force, deadline)
+
+# indeks id -> kafe, dibangun ulang hanya saat daftar kafe berganti
+_cafe_index_cache = {"src": None, "index": {}, "lock": threading.Lock()}
+
+def cafe_index(deadline=None):
+    cafes = fetch_all_cafes(deadline=deadline)
+    with _cafe_index_cache["lock"]:
+        if cafes is _cafe_index_cache["src"]:
+            return _cafe_index_cache["index"]
+    index = {}
+    for c in cafes or []:
+        try:
+            index[int(c.get("nomor", c.get("id_cafe", c.get("id", -999))))] = c
+        except (ValueError, TypeError):
+            continue
+    with _cafe_index_cache["lock"]:
+        _cafe_index_cache["src"] = cafes
+        _cafe_index_cache["index"] = index
+    return index
+
+def fetch_cafe(cid, deadline=None):
+    try:
+        c = cafe_index(deadline).get(int(cid))
+    except (ValueError, TypeError):
+        c = None
+    if c is not None:
+        return c
+    data = source.cafe(cid, deadline)
     return data or {}
 
-def fetch_user(uid):
-    users = fetch_all_users()
-    if users:
-        for u in users:
-            try:
-                if int(u.get("id_user", u.get("id", -999))) == int(uid):
-                    return u
-            except (ValueError, TypeError):
-                continue
-    data = safe_get(f"{BASE}/api/users/{uid}")
+# indeks id -> pengguna, dibangun ulang hanya saat daftar pengguna berganti
+_user_index_cache = {"src": None, "index": {}, "lock": threading.Lock()}
+
+def user_index(deadline=None):
+    users = fetch_all_users(deadline=deadline)
+    with _user_index_cache["lock"]:
+        if users is _user_index_cache["src"]:
+            return _user_index_cache["index"]
+    index = {}
+    for u in users or []:
+        try:
+            index.setdefault(int(u.get("id_user", u.get("id", -999))), u)
+        except (ValueError, TypeError):
+            continue
+    with _user_index_cache["lock"]:
+        _user_index_cache["src"] = users
+        _user_index_cache["index"] = index
+    return index
+
+def fetch_user(uid, deadline=None):
+    try:
+        u = user_index(deadline).get(int(uid))
+    except (ValueError, TypeError):
+        u = None
+    if u is not None:
+        return u
+    data = source.user(uid, deadline)
     return data or {}
 
-def fetch_visited(uid):
-    u = fetch_user(uid)
+@timed("fetch_visited")
+def fetch_visited(uid, deadline=None):
+    u = fetch_user(uid, deadline)
     if not u:
         return []
     raw = u.get("cafe_telah_dikunjungi") or u.get("cafe_telah_dikunjungi", "[]")
@@ -141,113 +512,299 @@ def _normalize_visited_list(raw_vis):
                 pass
     return out
 
-# ekstraksi sinyal dari riwayat kunjungan pengguna
-def rec_visited_freq(uid):
-    users = fetch_all_users()
-    if not users:
-        return {}
-
-    # Riwayat kunjungan pengguna target
-    my_seq = []
-    for u in users:
-        try:
-            u_id = int(u.get("id_user", u.get("id", -1)))
-            if u_id == int(uid):
-                raw = u.get("cafe_telah_dikunjungi") or u.get("visited") or "[]"
-                my_seq = _normalize_visited_list(raw)
-                break
-        except (ValueError, TypeError):
-            continue
-
-    if not my_seq:
-        try:
-            raw2 = fetch_visited(uid)
-            my_seq = _normalize_visited_list(raw2)
-        except Exception:
-            my_seq = []
-
-    if not my_seq:
-        return {}
-
-    # Peta transisi A->B dari pengguna lain
-    trans = defaultdict(list)
-    for other in users:
-        try:
-            other_id = int(other.get("id_user", other.get("id", -1)))
-            if other_id == int(uid):
-                continue
-        except (ValueError, TypeError):
-            continue
-
-        raw_other = other.get("cafe_telah_dikunjungi") or other.get("visited") or "[]"
-        seq2 = _normalize_visited_list(raw_other)
-        for a, b in zip(seq2, seq2[1:]):
+# PROFILE STORE (diparse sekali per refresh data pengguna)
+# kunjungan & menu favorit seluruh pengguna disimpan sebagai array NumPy datar bergaya CSR:
+#   visit_ids[visit_ptr[r]:visit_ptr[r + 1]] = urutan kunjungan pengguna baris r
+#   fav_cafe / fav_menu / fav_harga[fav_ptr[r]:fav_ptr[r + 1]] = menu favoritnya
+# ditambah transisi a -> b yang sudah dipasangkan, sehingga fungsi sinyal tidak perlu json.loads lagi
+class ProfileStore:
+    __slots__ = (
+        "src", "user_ids", "pos", "visit_ptr", "visit_ids", "fav_ptr", "fav_owner", "fav_cafe",
+        "fav_menu", "fav_harga", "menus", "menu_index", "trans_user", "trans_src", "trans_dst",
+    )
+
+    def __init__(self, users):
+        self.src = users
+        self.menus = []
+        self.menu_index = {}
+        user_ids, visit_lens, visits = [], [], []
+        fav_lens, fav_cafe, fav_menu, fav_harga = [], [], [], []
+        for u in users or []:
             try:
-                trans[int(a)].append(int(b))
+                uid = int(u.get("id_user", u.get("id", -1)))
             except (ValueError, TypeError):
                 continue
+            seq = _normalize_visited_list(u.get("cafe_telah_dikunjungi") or u.get("visited"))
+            n_fav = 0
+            for m in _favourite_list(u):
+                if not isinstance(m, dict) or "id_cafe" not in m:
+                    continue
+                try:
+                    cid = int(m["id_cafe"])
+                except (ValueError, TypeError):
+                    continue
+                # harga lama berupa string "24.000" (sebelum migrate_schema) ikut diparse
+                harga = parse_price(m.get("harga"))
+                harga = np.nan if harga is None else float(harga)
+                fav_cafe.append(cid)
+                fav_menu.append(self._intern_menu(m["nama_menu"]) if "nama_menu" in m else -1)
+                fav_harga.append(harga)
+                n_fav += 1
+            user_ids.append(uid)
+            visit_lens.append(len(seq))
+            visits.extend(seq)
+            fav_lens.append(n_fav)
+
+        n = len(user_ids)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.pos = {}
+        for r, uid in enumerate(user_ids):
+            self.pos.setdefault(uid, r)
+        self.visit_ptr = np.concatenate([[0], np.cumsum(visit_lens, dtype=np.int64)]).astype(np.int64)
+        self.visit_ids = np.asarray(visits, dtype=np.int64)
+        self.fav_ptr = np.concatenate([[0], np.cumsum(fav_lens, dtype=np.int64)]).astype(np.int64)
+        self.fav_owner = np.repeat(np.arange(n, dtype=np.int64), fav_lens)
+        self.fav_cafe = np.asarray(fav_cafe, dtype=np.int64)
+        self.fav_menu = np.asarray(fav_menu, dtype=np.int32)
+        self.fav_harga = np.asarray(fav_harga, dtype=np.float64)
+
+        owner = np.repeat(np.arange(n, dtype=np.int64), visit_lens)
+        same_user = owner[1:] == owner[:-1]
+        self.trans_user = owner[1:][same_user]
+        self.trans_src = self.visit_ids[:-1][same_user]
+        self.trans_dst = self.visit_ids[1:][same_user]
+
+    def _intern_menu(self, name):
+        mid = self.menu_index.get(name)
+        if mid is None:
+            mid = self.menu_index[name] = len(self.menus)
+            self.menus.append(name)
+        return mid
+
+    def visits(self, r):
+        return self.visit_ids[self.visit_ptr[r]:self.visit_ptr[r + 1]]
+
+    def favourite_menus(self, r):
+        menus = self.fav_menu[self.fav_ptr[r]:self.fav_ptr[r + 1]]
+        return menus[menus >= 0]
+
+    # jumlah transisi a -> b dari pengguna lain untuk setiap a di seq (a yang berulang dihitung berulang)
+    def transition_counts(self, seq, exclude_row=-1):
+        seq = np.asarray(seq, dtype=np.int64)
+        if not len(seq) or not len(self.trans_src):
+            return {}
+        uniq, mult = np.unique(seq, return_counts=True)
+        idx = np.minimum(np.searchsorted(uniq, self.trans_src), len(uniq) - 1)
+        hit = (uniq[idx] == self.trans_src) & (self.trans_user != exclude_row)
+        if not hit.any():
+            return {}
+        dst, inv = np.unique(self.trans_dst[hit], return_inverse=True)
+        counts = np.bincount(inv, weights=mult[idx[hit]])
+        return {int(c): int(k) for c, k in zip(dst, counts)}
+
+    # kafe tempat pengguna lain menyukai menu yang sama -> daftar nama menu tersebut
+    def cooccur(self, menu_ids, exclude_row=-1):
+        menu_ids = np.unique(np.asarray([m for m in menu_ids if m is not None and m >= 0], dtype=np.int32))
+        if not len(menu_ids):
+            return {}
+        hit = np.isin(self.fav_menu, menu_ids) & (self.fav_owner != exclude_row)
+        cooc = defaultdict(set)
+        for cid, mid in zip(self.fav_cafe[hit].tolist(), self.fav_menu[hit].tolist()):
+            cooc[cid].add(self.menus[mid])
+        return {cid: sorted(ms) for cid, ms in cooc.items()}
+
+    # interaksi (pengguna, kafe, harga) untuk matriks CF; favorit tanpa harga valid dilewati
+    def interaction_frame(self):
+        ok = np.isfinite(self.fav_harga)
+        return pd.DataFrame({
+            "user_id": self.user_ids[self.fav_owner[ok]],
+            "cafe_id": self.fav_cafe[ok],
+            "harga": self.fav_harga[ok].astype(np.int64),
+        })
 
-    # hitung frekuensi kemunculan di transisi
-    flat = []
-    for a in my_seq:
-        try:
-            flat.extend(trans.get(int(a), []))
-        except (ValueError, TypeError):
-            continue
-
-    if not flat:
-        return {}
-
-    counts = {}
-    for v in flat:
-        counts[v] = counts.get(v, 0) + 1
-    return counts
-
-# ekstraksi sinyal dari menu yang disukai pengguna
-def rec_menu_cooccur(uid):
-    users = fetch_all_users()
-
-    me = next((u for u in users if str(u.get("id_user", u.get("id", -1))) == str(uid)), {})
-    if not me:
-        me = fetch_user(uid)
-    if not me:
-        return {}
+    def nbytes(self):
+        return sum(getattr(self, k).nbytes for k in self.__slots__ if isinstance(getattr(self, k), np.ndarray))
 
-    raw = me.get("menu_yang_disukai") or "[]"
+def _favourite_list(u):
+    raw = u.get("menu_yang_disukai") or "[]"
     try:
-        my_list = json.loads(raw) if isinstance(raw, str) else raw
+        favs = json.loads(raw) if isinstance(raw, str) else raw
     except json.JSONDecodeError:
-        my_list = []
-
-    my_menus = {m["nama_menu"] for m in my_list if isinstance(m, dict) and "nama_menu" in m}
-    if not my_menus:
-        return {}
+        return []
+    return favs if isinstance(favs, list) else []
+
+# store per daftar pengguna (global maupun fold evaluasi), dibangun sekali per objek list
+_profile_stores = OrderedDict()
+_profile_store_lock = threading.Lock()
+PROFILE_STORE_SLOTS = 8
+
+def profile_store(users):
+    key = id(users)
+    with _profile_store_lock:
+        store = _profile_stores.get(key)
+        if store is not None and store.src is users:
+            _profile_stores.move_to_end(key)
+            return store
+    with stage("profile_store_build"):
+        store = ProfileStore(users)
+    with _profile_store_lock:
+        _profile_stores[key] = store
+        while len(_profile_stores) > PROFILE_STORE_SLOTS:
+            _profile_stores.popitem(last=False)
+    return store
+
+def get_profile_store(deadline=None):
+    return profile_store(fetch_all_users(deadline=deadline))
 
-    cooc = defaultdict(set)
-    for other in users:
+# ekstraksi sinyal dari riwayat kunjungan pengguna
+def rec_visited_freq(uid, deadline=None):
+    store = get_profile_store(deadline)
+    r = store.pos.get(int(uid))
+    my_seq = store.visits(r) if r is not None else []
+    if not len(my_seq):
         try:
-            other_id = other.get("id_user") or other.get("id")
-            if other_id is None or str(other_id) == str(uid):
-                continue
+            my_seq = _normalize_visited_list(fetch_visited(uid, deadline))
         except Exception:
-            continue
-
-        raw2 = other.get("menu_yang_disukai") or "[]"
-        try:
-            favs2 = json.loads(raw2) if isinstance(raw2, str) else raw2
-        except json.JSONDecodeError:
-            favs2 = []
-
-        for m in (favs2 if isinstance(favs2, list) else []):
-            if not isinstance(m, dict) or "nama_menu" not in m:
-                continue
-            if m.get("nama_menu") in my_menus:
+            my_seq = []
+    # frekuensi kemunculan di transisi A->B dari pengguna lain
+    return store.transition_counts(my_seq, exclude_row=-1 if r is None else r)
+
+# MODEL SEKUENS N-GRAM (orde 1-3, stupid backoff)
+# tabel hitungan konteks -> {kafe berikutnya: jumlah}, dengan id kafe di-intern menjadi int kecil;
+# diperbarui inkremental: hanya kunjungan baru di akhir riwayat yang dihitung ulang
+SEQ_MAX_ORDER = 3
+SEQ_BACKOFF = 0.4
+VF_SIGNALS = ("transitions", "ngram")
+DEFAULT_VF = "transitions"
+
+class SequenceModel:
+    def __init__(self, max_order=SEQ_MAX_ORDER):
+        self.max_order = max_order
+        self.index = {}
+        self.cafes = []
+        self.tables = [{} for _ in range(max_order)]
+        self.sequences = {}
+        self._lock = threading.Lock()
+
+    def _intern(self, cid):
+        i = self.index.get(cid)
+        if i is None:
+            i = self.index[cid] = len(self.cafes)
+            self.cafes.append(cid)
+        return i
+
+    # tambah (delta=1) / kurangi (delta=-1) hitungan transisi yang berakhir di posisi >= start
+    def _count(self, seq, start, delta):
+        for j in range(max(start, 1), len(seq)):
+            nxt = seq[j]
+            for order in range(1, min(self.max_order, j) + 1):
+                table = self.tables[order - 1]
+                ctx = seq[j - order:j]
+                counts = table.setdefault(ctx, {})
+                c = counts.get(nxt, 0) + delta
+                if c > 0:
+                    counts[nxt] = c
+                else:
+                    counts.pop(nxt, None)
+                    if not counts:
+                        del table[ctx]
+
+    def _update_user(self, uid, cids):
+        seq = tuple(self._intern(c) for c in cids)
+        old = self.sequences.get(uid, ())
+        if seq[:len(old)] == old:
+            self._count(seq, len(old), 1)
+        else:
+            # riwayat berubah di tengah: hitungan lama dicabut lalu dihitung ulang
+            self._count(old, 0, -1)
+            self._count(seq, 0, 1)
+        self.sequences[uid] = seq
+
+    def update(self, users):
+        present = set()
+        with self._lock:
+            for u in users or []:
                 try:
-                    cooc[int(m["id_cafe"])].add(m["nama_menu"])
+                    uid = int(u.get("id_user", u.get("id", -1)))
                 except (ValueError, TypeError):
-                    pass
+                    continue
+                present.add(uid)
+                self._update_user(uid, _normalize_visited_list(u.get("cafe_telah_dikunjungi")))
+            for uid in [k for k in self.sequences if k not in present]:
+                self._count(self.sequences.pop(uid), 0, -1)
+        return self
+
+    # skor kafe berikutnya untuk akhiran riwayat; kandidat memakai orde tertinggi yang pernah muncul.
+    # exclude = riwayat pengguna itu sendiri, agar transisinya tidak ikut dihitung
+    def score(self, history, exclude=None, backoff=SEQ_BACKOFF):
+        seq = tuple(self.index.get(c, -1) for c in history)
+        own = tuple(self.index.get(c, -1) for c in exclude) if exclude else ()
+        scores = {}
+        with self._lock:
+            for order in range(min(self.max_order, len(seq)), 0, -1):
+                ctx = seq[-order:]
+                counts = dict(self.tables[order - 1].get(ctx, {}))
+                for j in range(order, len(own)):
+                    if own[j - order:j] == ctx and own[j] in counts:
+                        counts[own[j]] -= 1
+                total = sum(c for c in counts.values() if c > 0)
+                if total <= 0:
+                    continue
+                weight = backoff ** (self.max_order - order)
+                for nxt, c in counts.items():
+                    cid = self.cafes[nxt]
+                    if c > 0 and cid not in scores:
+                        scores[cid] = weight * c / total
+        return scores
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cafes": len(self.cafes),
+                "users": len(self.sequences),
+                "contexts": [len(t) for t in self.tables],
+            }
+
+_sequence_model = SequenceModel()
+_sequence_src = {"src": None, "lock": threading.Lock()}
+
+# model sekuens bersama, diperbarui saat daftar pengguna berganti
+def get_sequence_model(deadline=None):
+    users = fetch_all_users(deadline=deadline)
+    with _sequence_src["lock"]:
+        if users is not _sequence_src["src"]:
+            _sequence_model.update(users)
+            _sequence_src["src"] = users
+    return _sequence_model
+
+# sinyal VF dari model n-gram (pengganti rec_visited_freq)
+def rec_visited_ngram(uid, deadline=None):
+    seq = _normalize_visited_list(fetch_visited(uid, deadline))
+    if not seq:
+        return {}
+    return get_sequence_model(deadline).score(seq, exclude=seq)
 
-    return {cid: sorted(list(ms)) for cid, ms in cooc.items()}
+# sinyal VF yang dipilih per request (?vf=transitions|ngram)
+@timed("visited_freq")
+def vf_signal_scores(vf, uid, deadline=None):
+    if vf == "ngram":
+        return rec_visited_ngram(uid, deadline)
+    return rec_visited_freq(uid, deadline)
+
+# ekstraksi sinyal dari menu yang disukai pengguna
+@timed("menu_cooccur")
+def rec_menu_cooccur(uid, deadline=None):
+    store = get_profile_store(deadline)
+    r = store.pos.get(int(uid))
+    if r is not None:
+        my_menus = store.favourite_menus(r).tolist()
+    else:
+        me = fetch_user(uid, deadline)
+        if not me:
+            return {}
+        my_menus = [store.menu_index.get(m["nama_menu"]) for m in _favourite_list(me)
+                    if isinstance(m, dict) and "nama_menu" in m]
+    return store.cooccur(my_menus, exclude_row=-1 if r is None else r)
 
 # function normalisasi sinyal dengan P95
 def robust_normalize_scores(scores_dict, pct=95):
@@ -270,24 +827,69 @@ def normalize_number(x, cap=1.0):
         return 0.0
     return max(0.0, min(1.0, xv / cap))
 
-# konfigurasi cache untuk skor sentimen
-_sentiment_cache = {}
+# konfigurasi cache untuk skor sentimen (LRU + TTL, disimpan ke file SQLite)
 _SENT_CACHE_TTL = 60 * 60  # 1 jam
+_SENT_CACHE_MAX = 5000
+_SENT_SNAPSHOT_FILE = os.environ.get(
+    "SENTIMENT_CACHE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentiment_cache.sqlite"),
+)
+_SENT_SNAPSHOT_INTERVAL = 5 * 60  # 5 menit
+_sentiment_cache = LRUCache(max_size=_SENT_CACHE_MAX, ttl=_SENT_CACHE_TTL)
 
 # cek cache skor sentimen jika ada
 def _sent_cache_get(cid):
-    ent = _sentiment_cache.get(cid)
-    if not ent:
-        return (False, None)
-    ts, val = ent
-    if now_ts() - ts > _SENT_CACHE_TTL:
-        _sentiment_cache.pop(cid, None)
-        return (False, None)
-    return (True, val)
+    return _sentiment_cache.get(cid)
 
 # simpan skor sentimen ke cache
-def _sent_cache_set(cid, value):
-    _sentiment_cache[cid] = (now_ts(), value)
+def _sent_cache_set(cid, value, ts=None):
+    _sentiment_cache.set(cid, value, ts)
+
+# simpan isi cache sentimen ke file agar tidak hilang saat restart
+def snapshot_sentiment_cache(path=None):
+    path = path or _SENT_SNAPSHOT_FILE
+    rows = [(int(cid), ts, val) for cid, ts, val in _sentiment_cache.items()]
+    try:
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sentiment_cache (cid INTEGER PRIMARY KEY, ts REAL, score REAL)")
+            conn.execute("DELETE FROM sentiment_cache")
+            conn.executemany("INSERT INTO sentiment_cache (cid, ts, score) VALUES (?, ?, ?)", rows)
+        conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Gagal menyimpan snapshot cache sentimen: {e}")
+        return 0
+    return len(rows)
+
+# muat snapshot cache sentimen (entri kedaluwarsa dilewati)
+def load_sentiment_cache(path=None):
+    path = path or _SENT_SNAPSHOT_FILE
+    if not os.path.exists(path):
+        return 0
+    try:
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT cid, ts, score FROM sentiment_cache ORDER BY ts").fetchall()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Gagal memuat snapshot cache sentimen: {e}")
+        return 0
+    loaded = 0
+    for cid, ts, score in rows:
+        if now_ts() - ts <= _SENT_CACHE_TTL:
+            _sent_cache_set(cid, score, ts)
+            loaded += 1
+    return loaded
+
+# snapshot berkala di thread latar
+def start_sentiment_snapshotter(interval=_SENT_SNAPSHOT_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            snapshot_sentiment_cache()
+    t = threading.Thread(target=loop, name="sentiment-snapshot", daemon=True)
+    t.start()
+    atexit.register(snapshot_sentiment_cache)
+    return t
 
 # hitung skor sentimen dalam skala 0 hingga 1
 def compute_sentiment_score_from_reviews(reviews):
@@ -329,13 +931,32 @@ def compute_sentiment_score_from_reviews(reviews):
     return float(max(0.0, min(1.0, smoothed)))
 
 # hitung skor sentimen
-def compute_sentiment_for_cafe(cid):
+def compute_sentiment_for_cafe(cid, deadline=None):
     # ambil sentimen dari cache (jika ada)
     exists, cached = _sent_cache_get(cid)
     if exists:
         return cached 
 
-    data = safe_get(f"{BASE}/api/sentiment/{cid}")
+    data = source.sentiment(cid, deadline)
+    # jangan cache hasil kosong akibat budget habis
+    if data is None and deadline is not None and deadline.expired():
+        return None
+
+    # if reviews is None:
+    #     raw = safe_get(f"{BASE}/api/reviews/{cid}")
+    #     if isinstance(raw, list):
+    #         reviews = raw
+    #     elif isinstance(raw, dict) and "reviews" in raw and isinstance(raw["reviews"], list):
+    #         reviews = raw["reviews"]
+    #     else:
+    #         reviews = None
+
+    score = _sentiment_score_from_payload(data)
+    _sent_cache_set(cid, score) 
+    return score
+
+# ambil list ulasan dari respons /api/sentiment/<id> lalu hitung skornya
+def _sentiment_score_from_payload(data):
     reviews = None
     if isinstance(data, list):
         reviews = data
@@ -349,22 +970,56 @@ def compute_sentiment_for_cafe(cid):
                     arr.extend(v)
             if arr:
                 reviews = arr
-
-    # if reviews is None:
-    #     raw = safe_get(f"{BASE}/api/reviews/{cid}")
-    #     if isinstance(raw, list):
-    #         reviews = raw
-    #     elif isinstance(raw, dict) and "reviews" in raw and isinstance(raw["reviews"], list):
-    #         reviews = raw["reviews"]
-    #     else:
-    #         reviews = None
-
-    score = compute_sentiment_score_from_reviews(reviews) if reviews is not None else None
-    _sent_cache_set(cid, score) 
-    return score
+    return compute_sentiment_score_from_reviews(reviews) if reviews is not None else None
+
+# ambil sentimen kafe yang belum ada di cache secara paralel (satu round-trip)
+@timed("sentiment_fetch")
+def prefetch_sentiments(cids, deadline=None):
+    missing = []
+    for cid in dict.fromkeys(cids):
+        exists, _ = _sent_cache_get(cid)
+        if not exists:
+            missing.append(cid)
+    if not missing:
+        return 0
+    results = source.sentiments(missing, deadline)
+    for cid, data in zip(missing, results):
+        if data is None and deadline is not None and deadline.expired():
+            continue
+        _sent_cache_set(cid, _sentiment_score_from_payload(data))
+    return len(missing)
+
+# ambil detail kafe yang tidak ada di daftar /api/data dalam satu request bulk (/api/cafes?ids=)
+def prefetch_cafes(cids, deadline=None):
+    index = cafe_index(deadline)
+    missing = [cid for cid in dict.fromkeys(cids) if int(cid) not in index]
+    if not missing:
+        return {}
+    return source.cafes_by_ids(missing, deadline)
+
+# detail sekumpulan kafe: id -> kafe, paling banyak satu round trip untuk id yang belum dikenal
+@timed("cafe_details")
+def fetch_cafes(cids, deadline=None):
+    extra = prefetch_cafes(cids, deadline)
+    index = cafe_index(deadline)
+    return {int(cid): index.get(int(cid)) or extra.get(int(cid)) or {} for cid in cids}
+
+# warm-up: isi cache sentimen seluruh kafe dalam satu panggilan bulk
+def warm_sentiment_cache():
+    data = source.all_sentiments()
+    if not isinstance(data, dict):
+        return 0
+    cafe_ids = set(cafe_index().keys())
+    cafe_ids.update(int(k) for k in data.keys() if str(k).lstrip("-").isdigit())
+    for cid in cafe_ids:
+        reviews = data.get(str(cid))
+        score = compute_sentiment_score_from_reviews(reviews) if isinstance(reviews, list) else None
+        _sent_cache_set(cid, score)
+    return len(cafe_ids)
 
 # bangun model UBCF (mean-centering + cosine-similarity + KNN)
-def build_cf_model():
+@timed("cf_build")
+def build_cf_model(deadline=None):
     """
     [SIM:a] Build model CF:
     - Pivot user x cafe (nilai = harga rata-rata)
@@ -372,34 +1027,13 @@ def build_cf_model():
     - Cosine-like similarity antar user
     - KNN di atas jarak = 1 - similarity
     """
-    records = []
-    users = fetch_all_users()
+    users = fetch_all_users(deadline=deadline)
     if not users:
-        data = safe_get(f"{BASE}/api/users") or []
+        data = source.users(deadline) or []
         users = data if isinstance(data, list) else []
 
-    # Kumpulkan interaksi pengguna ke kafe dengan harga dari 'menu_yang_disukai'
-    for u in users:
-        uid = u.get("id_user") or u.get("id") or u.get("user_id")
-        if uid is None:
-            continue
-        raw = u.get("menu_yang_disukai") or "[]"
-        try:
-            favs = json.loads(raw) if isinstance(raw, str) else raw
-        except json.JSONDecodeError:
-            favs = []
-        for m in (favs if isinstance(favs, list) else []):
-            if isinstance(m, dict) and "id_cafe" in m and "harga" in m:
-                try:
-                    records.append({
-                        "user_id": int(uid),
-                        "cafe_id": int(m["id_cafe"]),
-                        "harga":   int(str(m["harga"]).replace(".", ""))
-                    })
-                except (ValueError, TypeError):
-                    pass
-
-    df = pd.DataFrame(records)
+    # interaksi pengguna ke kafe dengan harga dari 'menu_yang_disukai' (sudah diparse di profile store)
+    df = profile_store(users).interaction_frame()
     if df.empty:
         print("Error: Tidak ada data interaksi valid untuk build_cf_model.")
         return pd.DataFrame(), pd.DataFrame(), None
@@ -425,6 +1059,7 @@ def build_cf_model():
     return mat, sim, knn
 
 # hitung skor UBCF untuk pengguna target
+@timed("knn")
 def rec_ubcf_scores(uid, mat, sim, knn):
     if knn is None or uid not in sim.index:
         return {}
@@ -443,37 +1078,1032 @@ def rec_ubcf_scores(uid, mat, sim, knn):
                 scores[cid] = val
     return scores
 
+# ITEM-BASED CF (kemiripan kafe x kafe, Top-K per kafe)
+# biaya skoring bergantung pada jumlah kafe yang pernah diinteraksikan pengguna, bukan jumlah pengguna
+IBCF_TOP_K = 20
+
+@timed("ibcf_build")
+def build_ibcf_model(mat, k=IBCF_TOP_K):
+    if mat is None or mat.empty:
+        return None
+    # cosine antar kolom matriks interaksi biner (pengguna x kafe)
+    X = (mat.values > 0).astype(np.float32)
+    co = X.T @ X
+    norm = np.sqrt(np.diag(co))
+    den = np.outer(norm, norm)
+    sim = np.divide(co, den, out=np.zeros_like(co), where=den > 0)
+    np.fill_diagonal(sim, 0.0)
+
+    # simpan hanya K tetangga terkuat per kafe dalam bentuk CSR
+    n = sim.shape[0]
+    k = min(k, max(n - 1, 0))
+    if k == 0:
+        nbr = np.zeros((n, 0), dtype=np.int64)
+    else:
+        nbr = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(sim, nbr, axis=1)
+    keep = vals > 0
+    S = csr_matrix((vals[keep], (np.repeat(np.arange(n), keep.sum(axis=1)), nbr[keep])), shape=(n, n), dtype=np.float32)
+    cafe_ids = np.asarray(mat.columns, dtype=np.int64)
+    return {"ids": cafe_ids, "pos": {int(c): i for i, c in enumerate(cafe_ids)}, "sim": S}
+
+# skor IBCF: jumlah kemiripan tetangga dari kafe yang pernah diinteraksikan pengguna
+def rec_ibcf_scores(uid, mat, items, history=()):
+    if items is None:
+        return {}
+    pos = items["pos"]
+    rows = set()
+    if uid in mat.index:
+        rows.update(np.flatnonzero(mat.loc[uid].values > 0).tolist())
+    rows.update(pos[c] for c in history if c in pos)
+    if not rows:
+        return {}
+    rows = sorted(rows)
+    scores = np.asarray(items["sim"][rows].sum(axis=0)).ravel()
+    scores[rows] = 0.0
+    ids = items["ids"]
+    return {int(ids[i]): float(scores[i]) for i in np.flatnonzero(scores > 0)}
+
+# cafe -> daftar (cafe_id, kemiripan) terurut
+def similar_cafes(cid, items, limit=10):
+    if items is None or cid not in items["pos"]:
+        return []
+    row = items["sim"].getrow(items["pos"][cid])
+    order = np.argsort(-row.data, kind="stable")[:max(0, limit)]
+    return [(int(items["ids"][row.indices[i]]), float(row.data[i])) for i in order]
+
+# MATRIX FACTORIZATION (implicit ALS, Hu-Koren-Volinsky)
+# interaksi = kunjungan + menu favorit; faktor disimpan float32,
+# pengguna baru di-fold-in tanpa melatih ulang, Top-N = satu perkalian matriks-vektor
+ALS_FACTORS = 32
+ALS_REG = 0.1
+ALS_ALPHA = 20.0
+ALS_ITERATIONS = 10
+
+# daftar id kafe yang diinteraksikan pengguna (boleh berulang = interaksi lebih kuat)
+def user_interactions(u):
+    cids = _normalize_visited_list(u.get("cafe_telah_dikunjungi"))
+    raw = u.get("menu_yang_disukai") or "[]"
+    try:
+        favs = json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        favs = []
+    for m in (favs if isinstance(favs, list) else []):
+        if isinstance(m, dict) and "id_cafe" in m:
+            try:
+                cids.append(int(m["id_cafe"]))
+            except (ValueError, TypeError):
+                pass
+    return cids
+
+# interaksi untuk evaluasi ranking: M kunjungan terakhir disembunyikan, termasuk menu favorit
+# di kafe tersebut, agar model tidak dilatih pada item yang akan diuji
+def holdout_interactions(u, m):
+    seq = _normalize_visited_list(u.get("cafe_telah_dikunjungi"))
+    cids = user_interactions(u)
+    if len(seq) < m + 1:
+        return cids
+    held = set(seq[-m:])
+    return seq[:-m] + [c for c in cids[len(seq):] if c not in held]
+
+# selesaikan faktor tiap baris R terhadap faktor kolom Y yang tetap
+def _als_solve(Y, YtY, R, reg=ALS_REG, alpha=ALS_ALPHA):
+    f = Y.shape[1]
+    X = np.zeros((R.shape[0], f), dtype=np.float32)
+    ridge = reg * np.eye(f, dtype=np.float32)
+    for r in range(R.shape[0]):
+        start, end = R.indptr[r], R.indptr[r + 1]
+        if start == end:
+            continue
+        Yi = Y[R.indices[start:end]]
+        conf = 1.0 + alpha * R.data[start:end]
+        # (YtY + Yi^T (C-I) Yi + reg*I) x = Yi^T C p
+        A = YtY + (Yi.T * (conf - 1.0)) @ Yi + ridge
+        X[r] = np.linalg.solve(A, Yi.T @ conf)
+    return X
+
+@timed("als_build")
+def build_als_model(users, factors=ALS_FACTORS, iterations=ALS_ITERATIONS, seed=42, interactions=user_interactions):
+    rows, cols, user_ids = [], [], []
+    for u in users or []:
+        try:
+            uid = int(u.get("id_user", u.get("id", -1)))
+        except (ValueError, TypeError):
+            continue
+        cids = interactions(u)
+        if not cids:
+            continue
+        rows.extend([len(user_ids)] * len(cids))
+        cols.extend(cids)
+        user_ids.append(uid)
+    if not rows:
+        return None
+
+    cafe_ids, col_idx = np.unique(np.asarray(cols, dtype=np.int64), return_inverse=True)
+    # entri duplikat dijumlahkan -> jumlah interaksi per (pengguna, kafe)
+    R = csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, col_idx)),
+                   shape=(len(user_ids), len(cafe_ids)), dtype=np.float32)
+    R.sum_duplicates()
+    Rt = R.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    U = (rng.standard_normal((R.shape[0], factors)) * 0.01).astype(np.float32)
+    V = (rng.standard_normal((R.shape[1], factors)) * 0.01).astype(np.float32)
+    for _ in range(iterations):
+        U = _als_solve(V, V.T @ V, R)
+        V = _als_solve(U, U.T @ U, Rt)
+
+    return {
+        "user_ids": np.asarray(user_ids, dtype=np.int64),
+        "user_pos": {uid: i for i, uid in enumerate(user_ids)},
+        "ids": cafe_ids,
+        "pos": {int(c): i for i, c in enumerate(cafe_ids)},
+        "U": U,
+        "V": V,
+        "VtV": V.T @ V,
+        "R": R,
+    }
+
+# faktor pengguna dari riwayat interaksinya, dengan faktor kafe tetap
+def als_fold_in(model, cids):
+    pos = model["pos"]
+    idx = [pos[c] for c in cids if c in pos]
+    if not idx:
+        return None
+    counts = np.bincount(idx, minlength=len(model["ids"])).astype(np.float32)
+    nz = np.flatnonzero(counts)
+    R = csr_matrix((counts[nz], (np.zeros(len(nz), dtype=np.int64), nz)), shape=(1, len(counts)))
+    return _als_solve(model["V"], model["VtV"], R)[0]
+
+# exclude: kafe yang dibuang dari hasil; default riwayat + seluruh interaksi pengguna di model.
+# fold_in=True: faktor pengguna dihitung dari history walau pengguna ada di model
+def rec_als_scores(uid, model, history=(), exclude=None, fold_in=False):
+    if model is None:
+        return {}
+    r = None if fold_in else model["user_pos"].get(uid)
+    seen = set(history) if exclude is None else set(exclude)
+    if r is not None:
+        x = model["U"][r]
+        R = model["R"]
+        if exclude is None:
+            seen.update(int(model["ids"][i]) for i in R.indices[R.indptr[r]:R.indptr[r + 1]])
+    else:
+        x = als_fold_in(model, history)
+        if x is None:
+            return {}
+    scores = model["V"] @ x
+    ids = model["ids"]
+    return {int(ids[i]): float(scores[i]) for i in np.flatnonzero(scores > 0) if int(ids[i]) not in seen}
+
+# True bila interaksi pengguna sekarang berbeda dari baris yang dipakai saat model dilatih
+# (pengguna baru, atau kunjungan/favorit bertambah sejak build terakhir)
+def als_row_stale(model, uid, history):
+    r = model["user_pos"].get(uid)
+    if r is None:
+        return True
+    R, ids, pos = model["R"], model["ids"], model["pos"]
+    trained = {int(ids[i]): int(n) for i, n in zip(R.indices[R.indptr[r]:R.indptr[r + 1]], R.data[R.indptr[r]:R.indptr[r + 1]])}
+    current = defaultdict(int)
+    for c in history:
+        if c in pos:
+            current[c] += 1
+    return trained != current
+
+# ANN UNTUK UBCF (random-projection LSH atas vektor pengguna yang di-mean-center)
+# tetangga dicari dari isi bucket yang sama di beberapa tabel hash, lalu diurutkan dengan
+# cosine pada kandidat saja; matriks kemiripan n x n tidak perlu dibentuk
+# lebar hash diturunkan dari jumlah pengguna (+- ANN_BUCKET_SIZE pengguna per bucket);
+# di bawah ANN_EXACT_BELOW pengguna seluruh baris dipindai (cukup murah, recall penuh)
+ANN_TABLES = 8
+ANN_BUCKET_SIZE = 32
+ANN_MAX_BITS = 16
+ANN_EXACT_BELOW = int(os.environ.get("UBCF_ANN_EXACT_BELOW", 2000))
+ANN_NEIGHBORS = 9
+
+def ann_bits(n):
+    return max(1, min(ANN_MAX_BITS, round(math.log2(max(n, 1) / ANN_BUCKET_SIZE))))
+
+def _lsh_codes(X, planes, tables, bits):
+    signs = (X @ planes.T > 0).reshape(len(X), tables, bits)
+    return (signs * (1 << np.arange(bits, dtype=np.int64))).sum(axis=2)
+
+@timed("ann_build")
+def build_ann_model(mat, tables=ANN_TABLES, bits=None, seed=42, exact_below=ANN_EXACT_BELOW):
+    if mat is None or mat.empty:
+        return None
+    values = mat.values.astype(np.float32)
+    X = values - values.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X /= np.where(norms > 0, norms, 1.0)
+    user_ids = np.asarray(mat.index, dtype=np.int64)
+    model = {
+        "user_pos": {int(u): i for i, u in enumerate(user_ids)},
+        "ids": np.asarray(mat.columns, dtype=np.int64),
+        "values": values,
+        "X": X,
+        "exact": len(X) < exact_below,
+        "bits": 0,
+        "codes": None,
+        "buckets": None,
+    }
+    if model["exact"]:
+        return model
+
+    bits = ann_bits(len(X)) if bits is None else bits
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((tables * bits, X.shape[1])).astype(np.float32)
+    codes = _lsh_codes(X, planes, tables, bits)
+    # tiap tabel: kode terurut + posisi baris, bucket dicari dengan searchsorted
+    buckets = []
+    for t in range(tables):
+        order = np.argsort(codes[:, t], kind="stable")
+        buckets.append((codes[order, t], order))
+    model.update(bits=bits, codes=codes, buckets=buckets)
+    return model
+
+def ann_candidates(model, r):
+    if model["exact"]:
+        cand = np.arange(len(model["X"]))
+        return cand[cand != r]
+    found = []
+    for t, (keys, order) in enumerate(model["buckets"]):
+        code = model["codes"][r, t]
+        found.append(order[np.searchsorted(keys, code, "left"):np.searchsorted(keys, code, "right")])
+    cand = np.unique(np.concatenate(found))
+    return cand[cand != r]
+
+# K tetangga terdekat (perkiraan) untuk baris r: (indeks baris, kemiripan)
+def ann_neighbors(model, r, k=ANN_NEIGHBORS):
+    cand = ann_candidates(model, r)
+    sims = model["X"][cand] @ model["X"][r]
+    top = top_n_indices(sims, k)
+    return cand[top], sims[top]
+
+def rec_ubcf_ann_scores(uid, model, k=ANN_NEIGHBORS):
+    if model is None or uid not in model["user_pos"]:
+        return {}
+    r = model["user_pos"][uid]
+    nbr, sims = ann_neighbors(model, r, k)
+    den = np.abs(sims).sum()
+    if den <= 0:
+        return {}
+    values = model["values"]
+    pred = (sims @ values[nbr]) / den
+    ids = model["ids"]
+    return {int(ids[i]): float(pred[i]) for i in np.flatnonzero((values[r] == 0) & (pred > 0))}
+
+# recall@K tetangga ANN terhadap pencarian eksak pada sampel pengguna
+def ann_recall(model, k=ANN_NEIGHBORS, sample=200, seed=42):
+    if model is None:
+        return {}
+    X = model["X"]
+    n = len(X)
+    rows = np.random.default_rng(seed).choice(n, size=min(sample, n), replace=False)
+    hits = total = scanned = 0
+    for r in rows:
+        exact_s = X @ X[r]
+        exact_s[r] = -np.inf
+        exact = set(top_n_indices(exact_s, min(k, n - 1)).tolist())
+        approx = set(ann_neighbors(model, r, k)[0].tolist())
+        hits += len(exact & approx)
+        total += len(exact)
+        scanned += len(ann_candidates(model, r))
+    return {
+        f"recall@{k}": round(hits / total, 4) if total else 0.0,
+        "candidates_per_query": round(scanned / len(rows), 2) if len(rows) else 0.0,
+        "users": n,
+        "sampled": int(len(rows)),
+        "exact": model["exact"],
+        "bits": model["bits"],
+    }
+
+# mesin CF yang bisa dipilih per request (?engine=...)
+CF_ENGINES = ("ubcf", "ubcf_ann", "ibcf", "als")
+DEFAULT_ENGINE = "ubcf"
+
+# fungsi skor CF (uid, riwayat) -> {cafe_id: skor} untuk model yang sudah dibangun;
+# riwayat dipakai IBCF & ALS untuk pengguna yang belum ada di model
+def cf_scorer(engine, mat, sim, knn, model=None, users=None):
+    if engine == "ibcf":
+        model = model if model is not None else build_ibcf_model(mat)
+        return lambda uid, history=(): rec_ibcf_scores(uid, mat, model, history)
+    if engine == "als":
+        model = model if model is not None else build_als_model(users)
+        return lambda uid, history=(): rec_als_scores(uid, model, history)
+    if engine == "ubcf_ann":
+        model = model if model is not None else build_ann_model(mat)
+        return lambda uid, history=(): rec_ubcf_ann_scores(uid, model)
+    return lambda uid, history=(): rec_ubcf_scores(uid, mat, sim, knn)
+
 # gabungkan kandidat dari tiga sinyal
 def build_candidate_pool_from_signals(ubcf_raw, vf_raw, co_raw, top_n_each=50):
     pool = set()
-    pool.update(sorted(ubcf_raw.keys(), key=lambda k: -ubcf_raw.get(k, 0))[:top_n_each])
-    pool.update(sorted(vf_raw.keys(), key=lambda k: -vf_raw.get(k, 0))[:top_n_each])
-    pool.update(sorted(co_raw.keys(), key=lambda k: -len(co_raw.get(k, [])))[:top_n_each])
+    pool.update(heapq.nlargest(top_n_each, ubcf_raw, key=lambda k: ubcf_raw.get(k, 0)))
+    pool.update(heapq.nlargest(top_n_each, vf_raw, key=lambda k: vf_raw.get(k, 0)))
+    pool.update(heapq.nlargest(top_n_each, co_raw, key=lambda k: len(co_raw.get(k, []))))
     return list(pool)
 
+# ambil indeks Top-N dari array skor (argpartition, lalu urutkan hanya N elemen)
+def top_n_indices(scores, n):
+    if n <= 0 or scores.size == 0:
+        return np.array([], dtype=int)
+    if n < scores.size:
+        idx = np.argpartition(-scores, n - 1)[:n]
+    else:
+        idx = np.arange(scores.size)
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+DEFAULT_TOP_N = 6
+MAX_TOP_N = 50
+
+# INDEKS GEOSPASIAL (BallTree haversine di atas koordinat kafe)
+EARTH_RADIUS_KM = 6371.0088
+_geo_index_cache = {"src": None, "ids": None, "tree": None, "lock": threading.Lock()}
+
+def _to_float(v):
+    try:
+        return float(str(v).strip())
+    except (ValueError, TypeError):
+        return float("nan")
+
+def geo_index(deadline=None):
+    cafes = fetch_all_cafes(deadline=deadline)
+    with _geo_index_cache["lock"]:
+        if cafes is _geo_index_cache["src"]:
+            return _geo_index_cache["ids"], _geo_index_cache["tree"]
+    cols = columns_of(cafes, ["nomor", "latitude", "longitude"])
+    nomor = np.array([_to_float(v) for v in cols["nomor"]], dtype=float)
+    lat = np.array([_to_float(v) for v in cols["latitude"]], dtype=float)
+    lon = np.array([_to_float(v) for v in cols["longitude"]], dtype=float)
+    ok = np.isfinite(nomor) & np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    ids = nomor[ok].astype(np.int64)
+    tree = BallTree(np.radians(np.column_stack([lat[ok], lon[ok]])), metric="haversine") if ok.any() else None
+    with _geo_index_cache["lock"]:
+        _geo_index_cache["src"] = cafes
+        _geo_index_cache["ids"] = ids
+        _geo_index_cache["tree"] = tree
+    return ids, tree
+
+# kafe dalam cincin jarak [min_km, max_km] dari titik (lat, lon), urut dari yang terdekat
+def cafes_within(lat, lon, min_km=0.0, max_km=None, deadline=None):
+    ids, tree = geo_index(deadline)
+    if tree is None:
+        return []
+    point = np.radians([[lat, lon]])
+    if max_km is None:
+        dist, idx = tree.query(point, k=len(ids))
+        dist, idx = dist[0], idx[0]
+    else:
+        idx, dist = tree.query_radius(point, r=max_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+        idx, dist = idx[0], dist[0]
+    dist_km = dist * EARTH_RADIUS_KM
+    keep = dist_km >= (min_km or 0.0)
+    return [(int(ids[i]), float(d)) for i, d in zip(idx[keep], dist_km[keep])]
+
+@app.route("/api/cafes/near")
+def api_cafes_near():
+    lat = _to_float(request.args.get("lat"))
+    lon = _to_float(request.args.get("lon"))
+    if math.isnan(lat) or math.isnan(lon):
+        return jsonify({"error": "Parameter lat dan lon wajib diisi"}), 400
+    min_km = _to_float(request.args.get("min_km", 0))
+    max_km = _to_float(request.args.get("max_km")) if "max_km" in request.args else None
+    min_km = 0.0 if math.isnan(min_km) else min_km
+    if max_km is not None and math.isnan(max_km):
+        max_km = None
+    try:
+        limit = int(request.args.get("limit", 50))
+    except (ValueError, TypeError):
+        limit = 50
+
+    index = cafe_index()
+    results = []
+    for cid, d in cafes_within(lat, lon, min_km, max_km)[:max(0, limit)]:
+        info = index.get(cid, {})
+        results.append({
+            "cafe_id": cid,
+            "nama_kafe": info.get("nama_kafe", ""),
+            "alamat": info.get("alamat", ""),
+            "distance_km": round(d, 3),
+        })
+    return jsonify({"cafes": results})
+
+# INDEKS FASILITAS (bitmask per kafe, parser di cafe_common.facilities)
+_facility_index_cache = {"src": None, "ids": None, "masks": None, "lock": threading.Lock()}
+
+def facility_index(deadline=None):
+    cafes = fetch_all_cafes(deadline=deadline)
+    with _facility_index_cache["lock"]:
+        if cafes is _facility_index_cache["src"]:
+            return _facility_index_cache["ids"], _facility_index_cache["masks"]
+        cols = columns_of(cafes, ["nomor", "fasilitas"])
+        nomor = np.array([_to_float(v) for v in cols["nomor"]], dtype=float)
+        ok = np.isfinite(nomor)
+        ids = nomor[ok].astype(np.int64)
+        masks = np.fromiter((facility_mask(t) for t in cols["fasilitas"][ok]), dtype=np.int64, count=int(ok.sum()))
+        _facility_index_cache["src"] = cafes
+        _facility_index_cache["ids"] = ids
+        _facility_index_cache["masks"] = masks
+        return ids, masks
+
+def cafes_with_facilities(names, match="all", deadline=None):
+    ids, masks = facility_index(deadline)
+    return set(ids[facility_filter(masks, names, match)].tolist())
+
+@app.route("/api/cafes/facilities")
+def api_cafes_facilities():
+    names = [n for n in request.args.get("fasilitas", "").split(",") if n.strip()]
+    match = request.args.get("match", "all").lower()
+    index = cafe_index()
+    ids = sorted(cafes_with_facilities(names, match))
+    return jsonify({
+        "vocabulary": facility_names(),
+        "cafes": [{"cafe_id": cid, "nama_kafe": index.get(cid, {}).get("nama_kafe", ""),
+                   "fasilitas": index.get(cid, {}).get("fasilitas", "")} for cid in ids],
+    })
+
+# INDEKS KISARAN HARGA
+# kolom integer <jenis>_min / <jenis>_max diisi saat data masuk (src/migrate_schema.py);
+# data lama yang belum dimigrasi diparse sekali saat indeks dibangun
+_price_index_cache = {"src": None, "index": {}, "lock": threading.Lock()}
+
+# indeks per jenis harga: array diurutkan menurut harga minimum + harga maksimum pasangannya
+def price_index(field="harga_makanan", deadline=None):
+    cafes = fetch_all_cafes(deadline=deadline)
+    with _price_index_cache["lock"]:
+        if cafes is not _price_index_cache["src"]:
+            built = {}
+            cols = columns_of(cafes, ["nomor"] + [f"{f}_{x}" for f in PRICE_RANGE_FIELDS for x in ("min", "max")])
+            nomor = np.array([_to_float(v) for v in cols["nomor"]], dtype=float)
+            for f in PRICE_RANGE_FIELDS:
+                lo = np.array([_to_float(v) for v in cols[f"{f}_min"]], dtype=float)
+                hi = np.array([_to_float(v) for v in cols[f"{f}_max"]], dtype=float)
+                missing = ~(np.isfinite(lo) & np.isfinite(hi))
+                for i in np.flatnonzero(missing):
+                    pr = parse_price_range(cafes[i].get(f))
+                    lo[i], hi[i] = (np.nan, np.nan) if pr[0] is None else pr
+                ok = np.isfinite(nomor) & np.isfinite(lo) & np.isfinite(hi)
+                order = np.argsort(lo[ok], kind="stable")
+                built[f] = (nomor[ok].astype(np.int64)[order], lo[ok][order], hi[ok][order])
+            _price_index_cache["src"] = cafes
+            _price_index_cache["index"] = built
+        return _price_index_cache["index"].get(field)
+
+# kafe yang kisaran harganya beririsan dengan [lo, hi]
+def cafes_in_price_range(lo=None, hi=None, field="harga_makanan", deadline=None):
+    entry = price_index(field, deadline)
+    if entry is None:
+        return []
+    ids, mins, maxs = entry
+    k = len(mins) if hi is None else int(np.searchsorted(mins, hi, side="right"))
+    keep = maxs[:k] >= (lo if lo is not None else -np.inf)
+    return ids[:k][keep].tolist()
+
+@app.route("/api/cafes/price_range")
+def api_cafes_price_range():
+    field = "harga_minuman" if request.args.get("jenis") == "minuman" else "harga_makanan"
+    lo = _to_float(request.args.get("min"))
+    hi = _to_float(request.args.get("max"))
+    lo = None if math.isnan(lo) else lo
+    hi = None if math.isnan(hi) else hi
+    entry = price_index(field)
+    index = cafe_index()
+    results = []
+    if entry is not None:
+        ids, mins, maxs = entry
+        pos = {cid: i for i, cid in enumerate(ids.tolist())}
+        for cid in cafes_in_price_range(lo, hi, field):
+            results.append({
+                "cafe_id": cid,
+                "nama_kafe": index.get(cid, {}).get("nama_kafe", ""),
+                f"{field}_min": int(mins[pos[cid]]),
+                f"{field}_max": int(maxs[pos[cid]]),
+            })
+    return jsonify({"jenis": field, "cafes": results})
+
+# MESIN CONTENT-BASED (cold start)
+# tiap kafe dikodekan sekali menjadi vektor fitur padat:
+#   [bit fasilitas | indoor, outdoor | titik tengah harga makanan & minuman (bin lunak) | rating]
+# preferensi pengguna dikodekan ke ruang yang sama, lalu seluruh kafe diranking dengan
+# satu perkalian matriks-vektor (cosine); lokasi masuk sebagai skor kedekatan bila diberikan
+CONTENT_WEIGHTS = {"facility": 1.0, "desain": 0.3, "price": 0.6, "rating": 0.5, "location": 0.3}
+PRICE_BINS = np.linspace(0.0, 1.0, 5)
+PRICE_BIN_WIDTH = 0.2
+_content_cache = {"src": None, "model": None, "built_at": 0, "lock": threading.Lock()}
+
+# harga ternormalisasi (0..1) -> keanggotaan pada tiap bin; dekat = dot product besar
+def _price_bins(p):
+    p = np.asarray(p, dtype=np.float32)
+    return np.exp(-(((p[..., None] - PRICE_BINS) / PRICE_BIN_WIDTH) ** 2)).astype(np.float32)
+
+def content_model(deadline=None):
+    cafes = fetch_all_cafes(deadline=deadline)
+    with _content_cache["lock"]:
+        if cafes is _content_cache["src"]:
+            return _content_cache["model"]
+    if not cafes:
+        return None
+
+    t0 = time.perf_counter()
+    cols = columns_of(cafes, ["nomor", "rating", "latitude", "longitude"])
+    nomor = np.array([_to_float(v) for v in cols["nomor"]], dtype=float)
+    ok = np.isfinite(nomor)
+    rows = [c for c, keep in zip(cafes, ok) if keep]
+    ids = nomor[ok].astype(np.int64)
+    n = len(ids)
+
+    # blok fasilitas: bit mask -> kolom 0/1
+    masks = np.fromiter((facility_mask(c.get("fasilitas")) for c in rows), dtype=np.int64, count=n)
+    n_bits = len(facility_names())
+    fac = ((masks[:, None] >> np.arange(n_bits, dtype=np.int64)) & 1).astype(np.float32)
+
+    desain = np.array([str(c.get("desain") or "").lower() for c in rows], dtype=object)
+    design = np.column_stack([
+        np.fromiter(("indoor" in d for d in desain), dtype=np.float32, count=n),
+        np.fromiter(("outdoor" in d for d in desain), dtype=np.float32, count=n),
+    ]) if n else np.zeros((0, 2), dtype=np.float32)
+
+    # titik tengah kisaran harga, diskalakan dengan harga tertinggi; kosong -> rata-rata
+    index = dict(zip(ids.tolist(), range(n)))
+    mids = np.full((n, len(PRICE_RANGE_FIELDS)), np.nan)
+    for j, field in enumerate(PRICE_RANGE_FIELDS):
+        entry = price_index(field, deadline)
+        if entry is None:
+            continue
+        for cid, lo, hi in zip(*entry):
+            i = index.get(int(cid))
+            if i is not None:
+                mids[i, j] = (lo + hi) / 2.0
+    price_scale = float(np.nanmax(mids)) if np.isfinite(mids).any() else 1.0
+    mids = mids / max(price_scale, 1.0)
+    finite = np.isfinite(mids)
+    col_mean = np.where(finite.any(axis=0), np.where(finite, mids, 0.0).sum(axis=0) / np.maximum(finite.sum(axis=0), 1), 0.5)
+    mids = np.where(finite, mids, col_mean)
+    price = np.concatenate([_price_bins(mids[:, j]) for j in range(mids.shape[1])], axis=1)
+
+    rating = np.clip(np.array([_to_float(v) for v in cols["rating"]], dtype=float)[ok] / 5.0, 0.0, 1.0)
+    rating = np.nan_to_num(rating)[:, None].astype(np.float32)
+
+    w = CONTENT_WEIGHTS
+    blocks = [fac * w["facility"], design * w["desain"], price * w["price"], rating * w["rating"]]
+    features = np.concatenate(blocks, axis=1).astype(np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    features /= np.where(norms > 0, norms, 1.0)
+
+    lat = np.array([_to_float(v) for v in cols["latitude"]], dtype=float)[ok]
+    lon = np.array([_to_float(v) for v in cols["longitude"]], dtype=float)[ok]
+
+    offsets = np.cumsum([0] + [b.shape[1] for b in blocks])
+    model = {
+        "ids": ids,
+        "pos": index,
+        "masks": masks,
+        "features": features,
+        "n_bits": n_bits,
+        "slices": {name: slice(offsets[k], offsets[k + 1]) for k, name in enumerate(("facility", "desain", "price", "rating"))},
+        "price_scale": max(price_scale, 1.0),
+        "coords": np.radians(np.column_stack([lat, lon])),
+    }
+    with _content_cache["lock"]:
+        _content_cache["src"] = cafes
+        _content_cache["model"] = model
+        _content_cache["build_s"] = time.perf_counter() - t0
+        _content_cache["built_at"] = now_ts()
+    return model
+
+# preferensi pengguna (fasilitas, harga menu favorit, kafe yang pernah dikunjungi) -> vektor satuan
+def content_user_vector(user, model, visited=()):
+    w = CONTENT_WEIGHTS
+    sl = model["slices"]
+    u = np.zeros(model["features"].shape[1], dtype=np.float32)
+
+    mask = facility_mask(user.get("preferensi_fasilitas"), create=False)
+    u[sl["facility"]] = ((mask >> np.arange(model["n_bits"])) & 1) * w["facility"]
+
+    raw = user.get("menu_yang_disukai") or "[]"
+    try:
+        favs = json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        favs = []
+    prices = []
+    for m in (favs if isinstance(favs, list) else []):
+        if isinstance(m, dict):
+            v = parse_price(m.get("harga"))
+            if v is not None:
+                prices.append(float(v))
+    if prices:
+        target = min(float(np.mean(prices)) / model["price_scale"], 1.0)
+        u[sl["price"]] = np.tile(_price_bins(target), len(PRICE_RANGE_FIELDS)) * w["price"]
+
+    u[sl["rating"]] = w["rating"]
+    norm = np.linalg.norm(u)
+    if norm > 0:
+        u /= norm
+
+    # profil dari kafe yang pernah dikunjungi (pengguna yang belum masuk matriks CF)
+    rows = [model["pos"][c] for c in visited if c in model["pos"]]
+    if rows:
+        u = u + model["features"][rows].mean(axis=0)
+        u /= np.linalg.norm(u) or 1.0
+    return u
+
+# skor content-based untuk seluruh kafe: (ids, skor), urutan sama dengan model["ids"]
+@timed("content")
+def content_scores(uid, location=None, deadline=None):
+    model = content_model(deadline)
+    if model is None or not len(model["ids"]):
+        return None, np.array([], dtype=np.float32)
+    user = fetch_user(uid, deadline) or {}
+    visited = _normalize_visited_list(user.get("cafe_telah_dikunjungi"))
+    scores = model["features"] @ content_user_vector(user, model, visited)
+
+    if location is not None:
+        lat, lon = np.radians(location[0]), np.radians(location[1])
+        coords = model["coords"]
+        a = np.sin((coords[:, 0] - lat) / 2) ** 2 + np.cos(lat) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - lon) / 2) ** 2
+        dist_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        _, max_km = _distance_bounds(uid, location, deadline)
+        proximity = np.exp(-np.nan_to_num(dist_km, nan=np.inf) / (max_km or 5.0))
+        w = CONTENT_WEIGHTS["location"]
+        scores = (1 - w) * scores + w * proximity
+    return model, scores
+
+# sinyal pengganti UBCF: Top-K kafe content-based untuk pengguna di luar matriks CF
+def rec_content_scores(uid, location=None, deadline=None, k=50):
+    model, scores = content_scores(uid, location, deadline)
+    if model is None:
+        return {}
+    ids = model["ids"]
+    return {int(ids[i]): float(scores[i]) for i in top_n_indices(scores, k) if scores[i] > 0}
+
+# rekomendasi cold start (pengguna tanpa riwayat kunjungan)
+def recommend_content(uid, top_n=DEFAULT_TOP_N, location=None, facilities=None, deadline=None, seen=()):
+    model, scores = content_scores(uid, location, deadline)
+    if model is None:
+        return []
+    ids = model["ids"]
+    keep = ~np.isin(ids, np.fromiter(seen, dtype=np.int64))
+
+    distances = {}
+    if location is not None:
+        min_km, max_km = _distance_bounds(uid, location, deadline)
+        distances = dict(cafes_within(location[0], location[1], min_km, max_km, deadline))
+        keep &= np.isin(ids, np.fromiter(distances, dtype=np.int64, count=len(distances)))
+
+    if facilities is not None:
+        names, match = facilities
+        if names == "pref":
+            names = parse_facilities((fetch_user(uid, deadline) or {}).get("preferensi_fasilitas"))
+        if names:
+            keep &= facility_filter(model["masks"], names, match)
+
+    cand = np.flatnonzero(keep)
+    index = cafe_index(deadline)
+    recs = []
+    for i in cand[top_n_indices(scores[cand], top_n)]:
+        cid = int(ids[i])
+        info = index.get(cid, {})
+        _, sent = _sent_cache_get(cid)
+        rating = _to_float(info.get("rating"))
+        rec = {
+            "cafe_id": cid,
+            "nama_kafe": info.get("nama_kafe", ""),
+            "alamat": info.get("alamat", ""),
+            "rating": 0.0 if math.isnan(rating) else rating,
+            "sentiment": round(float(sent), 2) if sent is not None else 0.5,
+            "score": round(float(scores[i]), 2),
+            "matched_menu": [],
+        }
+        if cid in distances:
+            rec["distance_km"] = round(distances[cid], 3)
+        recs.append(rec)
+    return recs
+
+# snapshot model CF; dibangun ulang hanya saat daftar pengguna berganti
+_model_snapshot = {"src": None, "model": None, "built_at": 0, "lock": threading.Lock()}
+
+def get_cf_model(deadline=None):
+    users = fetch_all_users(deadline=deadline)
+    with _model_snapshot["lock"]:
+        if _model_snapshot["model"] is None or users is not _model_snapshot["src"]:
+            t0 = time.perf_counter()
+            _model_snapshot["model"] = build_cf_model(deadline)
+            _model_snapshot["build_s"] = time.perf_counter() - t0
+            _model_snapshot["src"] = users
+            _model_snapshot["built_at"] = now_ts()
+        return _model_snapshot["model"]
+
+# model IBCF mengikuti snapshot matriks interaksi UBCF
+_ibcf_snapshot = {"src": None, "model": None, "built_at": 0, "lock": threading.Lock()}
+
+def get_ibcf_model(deadline=None):
+    mat, _, _ = get_cf_model(deadline)
+    with _ibcf_snapshot["lock"]:
+        if mat is not _ibcf_snapshot["src"]:
+            t0 = time.perf_counter()
+            _ibcf_snapshot["model"] = build_ibcf_model(mat)
+            _ibcf_snapshot["build_s"] = time.perf_counter() - t0
+            _ibcf_snapshot["src"] = mat
+            _ibcf_snapshot["built_at"] = now_ts()
+        return _ibcf_snapshot["model"]
+
+# model ALS dilatih di thread latar, tidak pernah di jalur request. Setelah daftar pengguna berganti,
+# faktor lama tetap dipakai (pengguna baru / yang berubah di-fold-in saat skoring) dan pelatihan
+# ulang dimulai paling cepat ALS_RETRAIN_S detik setelah build terakhir
+ALS_RETRAIN_S = float(os.environ.get("UBCF_ALS_RETRAIN_S", 600))
+_als_snapshot = {"src": None, "model": None, "built_at": 0, "inflight": None, "lock": threading.Lock()}
+
+def _train_als_snapshot(users, ev):
+    try:
+        t0 = time.perf_counter()
+        model = build_als_model(users)
+        with _als_snapshot["lock"]:
+            _als_snapshot["model"] = model
+            _als_snapshot["build_s"] = time.perf_counter() - t0
+            _als_snapshot["src"] = users
+            _als_snapshot["built_at"] = now_ts()
+    finally:
+        with _als_snapshot["lock"]:
+            _als_snapshot["inflight"] = None
+        ev.set()
+
+def get_als_model(deadline=None):
+    users = fetch_all_users(deadline=deadline)
+    with _als_snapshot["lock"]:
+        model = _als_snapshot["model"]
+        ev = _als_snapshot["inflight"]
+        if (ev is None and users and users is not _als_snapshot["src"]
+                and (model is None or now_ts() - _als_snapshot["built_at"] >= ALS_RETRAIN_S)):
+            ev = _als_snapshot["inflight"] = threading.Event()
+            threading.Thread(target=_train_als_snapshot, args=(users, ev), name="als-train", daemon=True).start()
+    if model is not None or ev is None:
+        return model
+    # belum ada model sama sekali: tunggu build pertama selama budget masih ada
+    if not ev.wait(deadline.remaining() if deadline is not None else None) and deadline is not None:
+        deadline.mark_truncated()
+    with _als_snapshot["lock"]:
+        return _als_snapshot["model"]
+
+# indeks ANN dibangun langsung dari matriks interaksi, tanpa matriks kemiripan dense
+_ann_snapshot = {"src": None, "model": None, "built_at": 0, "lock": threading.Lock()}
+
+def get_ann_model(deadline=None):
+    users = fetch_all_users(deadline=deadline)
+    with _ann_snapshot["lock"]:
+        if users is not _ann_snapshot["src"]:
+            t0 = time.perf_counter()
+            _ann_snapshot["model"] = build_ann_model(interaction_matrix(users))
+            _ann_snapshot["build_s"] = time.perf_counter() - t0
+            _ann_snapshot["src"] = users
+            _ann_snapshot["built_at"] = now_ts()
+        return _ann_snapshot["model"]
+
+# skor sinyal CF dari mesin yang dipilih, memakai snapshot model yang sedang aktif
+@timed("cf_scores")
+def cf_engine_scores(engine, uid, deadline=None):
+    if engine == "ubcf_ann":
+        return rec_ubcf_ann_scores(uid, get_ann_model(deadline))
+    if engine == "als":
+        model = get_als_model(deadline)
+        if model is None:
+            return {}
+        history = user_interactions(fetch_user(uid, deadline) or {})
+        return rec_als_scores(uid, model, history, fold_in=als_row_stale(model, uid, history))
+    mat, sim, knn = get_cf_model(deadline)
+    if engine == "ubcf":
+        return rec_ubcf_scores(uid, mat, sim, knn)
+    model = get_ibcf_model(deadline)
+    history = user_interactions(fetch_user(uid, deadline) or {})
+    return cf_scorer(engine, mat, sim, knn, model)(uid, history)
+
+@app.route("/api/cafes/<int:cid>/similar")
+def api_cafes_similar(cid):
+    try:
+        limit = int(request.args.get("limit", 10))
+    except (ValueError, TypeError):
+        limit = 10
+    index = cafe_index()
+    results = []
+    for other, score in similar_cafes(cid, get_ibcf_model(), limit):
+        results.append({
+            "cafe_id": other,
+            "nama_kafe": index.get(other, {}).get("nama_kafe", ""),
+            "similarity": round(score, 4),
+        })
+    return jsonify({"cafe_id": cid, "similar": results})
+
+# parameter request rekomendasi (dipakai route Flask & ASGI)
+def parse_recommend_args(args):
+    try:
+        top_n = int(args.get("n", DEFAULT_TOP_N))
+    except (ValueError, TypeError):
+        top_n = DEFAULT_TOP_N
+    top_n = max(1, min(top_n, MAX_TOP_N))
+
+    # budget latensi opsional (?budget_ms=300); tahap yang tidak sempat selesai diberi nilai default
+    try:
+        budget_ms = float(args["budget_ms"]) if "budget_ms" in args else None
+    except (ValueError, TypeError):
+        budget_ms = None
+    if budget_ms is not None and budget_ms <= 0:
+        budget_ms = None
+
+    # filter lokasi opsional (?lat=&lon=[&min_km=&max_km=]); tanpa batas eksplisit dipakai preferensi jarak pengguna
+    location = None
+    lat = _to_float(args.get("lat"))
+    lon = _to_float(args.get("lon"))
+    if not (math.isnan(lat) or math.isnan(lon)):
+        min_km = _to_float(args["min_km"]) if "min_km" in args else None
+        max_km = _to_float(args["max_km"]) if "max_km" in args else None
+        location = (
+            round(lat, 4),
+            round(lon, 4),
+            None if min_km is None or math.isnan(min_km) else min_km,
+            None if max_km is None or math.isnan(max_km) else max_km,
+        )
+
+    # filter fasilitas opsional (?fasilitas=AC,Toilet&match=all|any, atau ?fasilitas=pref untuk preferensi pengguna)
+    facilities = None
+    raw_fac = (args.get("fasilitas") or "").strip()
+    if raw_fac:
+        match = "any" if (args.get("match") or "").lower() == "any" else "all"
+        names = "pref" if raw_fac.lower() == "pref" else tuple(sorted(n.strip() for n in raw_fac.split(",") if n.strip()))
+        facilities = (names, match)
+
+    # mesin CF (?engine=ubcf|ubcf_ann|ibcf|als)
+    engine = (args.get("engine") or DEFAULT_ENGINE).strip().lower()
+    if engine not in CF_ENGINES:
+        engine = DEFAULT_ENGINE
+
+    # sinyal riwayat kunjungan (?vf=transitions|ngram)
+    vf = (args.get("vf") or DEFAULT_VF).strip().lower()
+    if vf not in VF_SIGNALS:
+        vf = DEFAULT_VF
+
+    # hasil batch precompute.py (?precomputed=1), jatuh ke skoring langsung bila basi
+    precomputed = (args.get("precomputed") or "").lower() in ("1", "true", "yes")
+    return {"top_n": top_n, "budget_ms": budget_ms, "location": location, "facilities": facilities,
+            "engine": engine, "vf": vf, "precomputed": precomputed}
+
 # api rekomendasi
 @app.route("/api/recommend/<int:uid>")
 def api_recommend(uid):
-    visited_list_raw = fetch_visited(uid)
+    return jsonify(recommend_for_user(uid, **parse_recommend_args(request.args)))
+
+# batas jarak dari parameter request atau dari preferensi jarak pengguna (km)
+def _distance_bounds(uid, location, deadline=None):
+    _, _, min_km, max_km = location
+    if min_km is None or max_km is None:
+        me = fetch_user(uid, deadline) or {}
+        if min_km is None:
+            min_km = _to_float(me.get("preferensi_jarak_minimal"))
+        if max_km is None:
+            max_km = _to_float(me.get("preferensi_jarak_maksimal"))
+    min_km = 0.0 if min_km is None or math.isnan(min_km) else min_km
+    max_km = None if max_km is None or math.isnan(max_km) or max_km <= 0 else max_km
+    return min_km, max_km
+
+# REKOMENDASI PRECOMPUTED (ditulis oleh precompute.py, dibaca read-only per request)
+PRECOMPUTED_FILE = os.environ.get(
+    "PRECOMPUTED_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "recommendations.sqlite"),
+)
+PRECOMPUTED_MAX_AGE = float(os.environ.get("PRECOMPUTED_MAX_AGE", 6 * 3600))
+
+def _precomputed_query(query, params=(), path=None):
+    path = path or PRECOMPUTED_FILE
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=1)
+        try:
+            return conn.execute(query, params).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Gagal membaca rekomendasi precomputed: {e}")
+        return None
+
+@timed("precomputed")
+def load_precomputed(uid, path=None):
+    row = _precomputed_query(
+        "SELECT recs, top_n, model_version, built_at FROM recommendations WHERE uid = ?", (int(uid),), path)
+    if row is None:
+        return None
+    return {"recommendations": json.loads(row[0]), "top_n": row[1], "model_version": row[2], "built_at": row[3]}
+
+def precomputed_info(path=None):
+    row = _precomputed_query(
+        "SELECT built_at, users, shards, workers, build_seconds, shard_stats FROM builds ORDER BY built_at DESC LIMIT 1",
+        path=path)
+    if row is None:
+        return None
+    return {
+        "built_at": row[0],
+        "age_s": round(now_ts() - row[0], 1),
+        "users": row[1],
+        "shards": row[2],
+        "workers": row[3],
+        "build_seconds": row[4],
+        "shard_stats": json.loads(row[5]),
+    }
+
+def recommend_for_user(uid, top_n=DEFAULT_TOP_N, budget_ms=None, location=None, facilities=None,
+                       engine=DEFAULT_ENGINE, vf=DEFAULT_VF, precomputed=False):
+    # waktu mulai sebelum fetch apa pun: hasil yang datanya dibaca sebelum invalidasi
+    # tercatat lebih tua dari invalidasi tersebut, walau selesai setelahnya
+    started = now_ts()
+    # hasil batch hanya untuk permintaan standar (tanpa filter, mesin & sinyal default);
+    # data pengguna yang berubah setelah batch dimulai (invalidasi) dijawab dengan skoring langsung
+    if precomputed and location is None and facilities is None and engine == DEFAULT_ENGINE and vf == DEFAULT_VF:
+        stored = load_precomputed(uid)
+        if (stored is not None and stored["model_version"] == MODEL_VERSION and top_n <= stored["top_n"]
+                and now_ts() - stored["built_at"] <= PRECOMPUTED_MAX_AGE
+                and stored["built_at"] > invalidated_at(uid)):
+            return {"recommendations": stored["recommendations"][:top_n], "precomputed": True,
+                    "built_at": stored["built_at"]}
+
+    deadline = Deadline(budget_ms)
+    degraded = []
+
+    # invalidasi dari worker lain: data pengguna di proses ini juga harus diambil ulang
+    invalidated = invalidated_at(uid)
+    if invalidated > _users_cache["ts"]:
+        expire_cache(_users_cache)
+
+    cache_key = (uid, MODEL_VERSION, _users_cache["version"], (top_n, location, facilities, engine, vf))
+    hit, cached = _result_cache.get(cache_key)
+    if hit and cached[0] > invalidated:
+        body = {"recommendations": cached[1], "cached": True}
+        if budget_ms is not None:
+            body["degraded"] = []
+        return body
+
+    def respond(recs):
+        # fetch yang terpotong budget di luar tahap yang sudah ditandai (mis. filter lokasi)
+        if deadline.truncated and not degraded:
+            degraded.append("fetch")
+        body = {"recommendations": recs}
+        if budget_ms is not None:
+            body["degraded"] = degraded
+        # hasil parsial (terdegradasi) atau hasil dari fetch backend yang gagal tidak disimpan ke cache
+        if not degraded and not deadline.failed:
+            _result_cache.set(cache_key, (started, recs))
+        return body
+
+    # tahap dilewati bila budget sudah habis; tahap yang fetch-nya terpotong budget juga ditandai
+    def run_stage(name, fn):
+        if deadline.expired():
+            degraded.append(name)
+            return {}
+        cut = deadline.truncated
+        out = fn()
+        if deadline.truncated > cut:
+            degraded.append(name)
+        return out
+
+    # pengguna tanpa riwayat kunjungan: rekomendasi content-based dari preferensinya
+    visited_list_raw = fetch_visited(uid, deadline)
+    if deadline.truncated:
+        degraded.append("visited")
     if not visited_list_raw:
-        return jsonify({"recommendations": []})
+        return respond(recommend_content(uid, top_n, location, facilities, deadline))
 
     # Build UBCF & memanggil skor sinyal riwayat kunjungan dan menu yang disukai
-    mat, sim, knn = build_cf_model()
-    ubcf_raw = rec_ubcf_scores(uid, mat, sim, knn)
-    vf_raw = rec_visited_freq(uid)
-    co_raw = rec_menu_cooccur(uid)
+    # (pengguna di luar matriks CF: sinyal CF diganti skor content-based)
+    ubcf_raw = run_stage("ubcf", lambda: cf_engine_scores(engine, uid, deadline) or rec_content_scores(uid, location, deadline))
+    vf_raw = run_stage("visited_freq", lambda: vf_signal_scores(vf, uid, deadline))
+    co_raw = run_stage("menu_cooccur", lambda: rec_menu_cooccur(uid, deadline))
 
     # Pool kandidat & filter kafe yang sudah dikunjungi
-    pool = build_candidate_pool_from_signals(ubcf_raw, vf_raw, co_raw, top_n_each=50)
-    MAX_POOL = 300
-    if len(pool) > MAX_POOL:
-        pool = pool[:MAX_POOL]
+    with stage("candidates"):
+        pool = build_candidate_pool_from_signals(ubcf_raw, vf_raw, co_raw, top_n_each=50)
+        MAX_POOL = 300
+        if len(pool) > MAX_POOL:
+            pool = pool[:MAX_POOL]
+
+        seen = set(_normalize_visited_list(visited_list_raw))
+        pool = [c for c in pool if c not in seen]
+
+        # pangkas kandidat berdasarkan jarak sebelum skoring
+        distances = {}
+        if location is not None and pool:
+            min_km, max_km = _distance_bounds(uid, location, deadline)
+            distances = dict(cafes_within(location[0], location[1], min_km, max_km, deadline))
+            pool = [c for c in pool if int(c) in distances]
+
+        # pangkas kandidat berdasarkan fasilitas (operasi bitwise atas array mask)
+        if facilities is not None and pool:
+            names, match = facilities
+            if names == "pref":
+                me = fetch_user(uid, deadline) or {}
+                names = parse_facilities(me.get("preferensi_fasilitas"))
+            if names:
+                allowed = cafes_with_facilities(names, match, deadline)
+                pool = [c for c in pool if int(c) in allowed]
 
-    seen = set(_normalize_visited_list(visited_list_raw))
-    pool = [c for c in pool if c not in seen]
     if not pool:
-        return jsonify({"recommendations": []})
+        return respond([])
 
     # Normalisasi skor
     ubcf_norm = robust_normalize_scores(ubcf_raw, pct=95)
@@ -487,69 +2117,216 @@ def api_recommend(uid):
     w_co = 0.2
     w_sent_and_rate = 0.1
 
-    rows = []
-    for cid in pool:
-        info = fetch_cafe(cid) or {}
-
-        cf_s = ubcf_norm.get(cid, 0.0)
-        vf_s = vf_norm.get(cid, 0.0)
-        co_s = co_norm.get(cid, 0.0)
-
-        # Normalisasi rating & sentimen
+    # skor seluruh kandidat dalam bentuk array
+    if deadline.expired():
+        degraded.append("cafe_details")
+        index = _cafe_index_cache["index"]
+        infos = [index.get(int(cid), {}) for cid in pool]
+    else:
+        # detail & sentimen seluruh kandidat diambil paralel, bukan satu per satu
+        cut = deadline.truncated
+        details = fetch_cafes(pool, deadline)
+        infos = [details[int(cid)] for cid in pool]
+        prefetch_sentiments(pool, deadline)
+        if deadline.truncated > cut:
+            degraded.append("cafe_details")
+    cf_s = np.array([ubcf_norm.get(cid, 0.0) for cid in pool], dtype=float)
+    vf_s = np.array([vf_norm.get(cid, 0.0) for cid in pool], dtype=float)
+    co_s = np.array([co_norm.get(cid, 0.0) for cid in pool], dtype=float)
+
+    # Normalisasi rating & sentimen
+    rating_vals = np.zeros(len(pool), dtype=float)
+    for i, info in enumerate(infos):
         try:
-            rating_val = float(info.get("rating", 0.0))
+            rating_vals[i] = float(info.get("rating", 0.0))
         except (ValueError, TypeError):
-            rating_val = 0.0
-        rating_n = normalize_number(rating_val, cap=5.0)
-
-        sent_score = compute_sentiment_for_cafe(cid)
-        sent_n = float(sent_score) if sent_score is not None else 0.5
-        sent_and_rate = (sent_n + rating_n) / 2.0
-
+            rating_vals[i] = 0.0
+    rating_n = np.clip(rating_vals / 5.0, 0.0, 1.0)
+
+    with stage("sentiment"):
+        # sentimen yang tidak sempat diambil memakai nilai default 0.5
+        sent_n = np.full(len(pool), 0.5, dtype=float)
+        sent_skipped = False
+        for i, cid in enumerate(pool):
+            if deadline.expired():
+                exists, sent_score = _sent_cache_get(cid)
+                sent_skipped = sent_skipped or not exists
+            else:
+                sent_score = compute_sentiment_for_cafe(cid, deadline)
+                sent_skipped = sent_skipped or (sent_score is None and deadline.expired())
+            if sent_score is not None:
+                sent_n[i] = float(sent_score)
+    if sent_skipped:
+        degraded.append("sentiment")
+    sent_and_rate = (sent_n + rating_n) / 2.0
+
+    with stage("rank"):
         # Menggabungkan semua sinyal menjadi skor akhir
-        combined = (w_cf * cf_s + w_vf * vf_s + w_co * co_s + w_sent_and_rate * sent_and_rate)
-
-        rows.append({
-            "cafe_id": cid,
-            "nama_kafe": info.get("nama_kafe", ""),
-            "alamat": info.get("alamat", ""),
-            "rating": rating_val,
-            "sentiment": round(sent_n, 2),
-            "score": round(float(combined), 2),
-            "matched_menu": co_raw.get(cid, [])
-        })
-
-    dfc = pd.DataFrame(rows)
-    if dfc.empty:
-        return jsonify({"recommendations": []})
-
-    # mengambil Top-6 rekomendasi berdasarkan skor akhir tertinggi
-    top6 = dfc.sort_values("score", ascending=False).head(6)
-    return jsonify({"recommendations": top6.to_dict("records")})
+        combined = np.round(w_cf * cf_s + w_vf * vf_s + w_co * co_s + w_sent_and_rate * sent_and_rate, 2)
+
+        # mengambil Top-N rekomendasi berdasarkan skor akhir tertinggi
+        recs = []
+        for i in top_n_indices(combined, top_n):
+            cid = pool[i]
+            info = infos[i]
+            recs.append({
+                "cafe_id": int(cid),
+                "nama_kafe": info.get("nama_kafe", ""),
+                "alamat": info.get("alamat", ""),
+                "rating": float(rating_vals[i]),
+                "sentiment": round(float(sent_n[i]), 2),
+                "score": float(combined[i]),
+                "matched_menu": co_raw.get(cid, [])
+            })
+            if int(cid) in distances:
+                recs[-1]["distance_km"] = round(distances[int(cid)], 3)
+    return respond(recs)
+
+# invalidasi cache hasil rekomendasi saat kunjungan / menu favorit pengguna berubah
+@app.route("/api/cache/invalidate/<int:uid>", methods=["POST"])
+def api_invalidate_user(uid):
+    # dicatat di store bersama untuk worker lain; cache proses ini langsung dibersihkan
+    mark_invalidated(uid)
+    removed = _result_cache.pop_where(lambda k: k[0] == uid)
+    # data pengguna harus diambil ulang agar perubahan langsung terlihat
+    expire_cache(_users_cache)
+    return jsonify({"uid": uid, "removed": removed})
+
+@app.route("/api/cache/stats")
+def api_cache_stats():
+    return jsonify({
+        "data_source": source.name,
+        "model_version": MODEL_VERSION,
+        "result_cache": _result_cache.stats(),
+        "sentiment_cache": _sentiment_cache.stats(),
+        "sequence_model": _sequence_model.stats(),
+        "precomputed": precomputed_info(),
+    })
+
+# metrik operasional format teks Prometheus
+def render_metrics():
+    lines = []
+    prom_metric(lines, "ubcf_http_requests_total", "counter", "Jumlah request HTTP per route dan status.",
+                request_counts.snapshot(), ("method", "route", "status"))
+    prom_histogram(lines, "ubcf_http_request_duration_seconds", "Latensi request HTTP per route.",
+                   request_latency, ("method", "route"))
+
+    lookups = _cache_counts.snapshot()
+    sizes = {}
+    for name, cache in (("result", _result_cache), ("sentiment", _sentiment_cache)):
+        st = cache.stats()
+        lookups[(name, "hit")] = st["hits"]
+        lookups[(name, "miss")] = st["misses"]
+        sizes[name] = st["size"]
+    for cache in (_users_cache, _cafes_cache):
+        sizes[cache["name"]] = len(cache["data"] or [])
+    prom_metric(lines, "ubcf_cache_lookups_total", "counter", "Lookup cache per hasil (hit/stale/miss).",
+                lookups, ("cache", "result"))
+    prom_metric(lines, "ubcf_cache_entries", "gauge", "Jumlah entri di cache.", sizes, ("cache",))
+
+    now = now_ts()
+    ages, builds = {}, {}
+    snapshots = (("ubcf", _model_snapshot), ("ibcf", _ibcf_snapshot), ("als", _als_snapshot),
+                 ("ubcf_ann", _ann_snapshot), ("content", _content_cache))
+    for name, snap in snapshots:
+        if snap.get("built_at"):
+            ages[name] = now - snap["built_at"]
+            builds[name] = float(snap.get("build_s", 0.0))
+    prom_metric(lines, "ubcf_model_age_seconds", "gauge", "Umur snapshot model sejak terakhir dibangun.",
+                ages, ("model",))
+    prom_metric(lines, "ubcf_model_build_duration_seconds", "gauge", "Durasi build terakhir snapshot model.",
+                builds, ("model",))
+
+    prom_metric(lines, "ubcf_backend_requests_total", "counter", "Panggilan HTTP ke backend per client dan hasil.",
+                _backend_calls.snapshot(), ("client", "outcome"))
+    prom_histogram(lines, "ubcf_stage_duration_seconds", "Durasi per tahap (fetch, build model, KNN, sentimen, ...).",
+                   stage_stats, ("stage",))
+    return "\n".join(lines) + "\n"
+
+@app.route("/metrics")
+def api_metrics():
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# histogram durasi per tahap sejak proses berjalan
+@app.route("/api/timing/stats")
+def api_timing_stats():
+    return jsonify({"buckets_ms": list(TIMING_BUCKETS_MS), "stages": stage_stats.stats()})
+
+# profil satu kali build model CF di luar snapshot yang sedang dipakai (?mode=mem|cpu, default mem);
+# untuk evaluasi cukup panggil /api/evaluate?profile=mem|cpu
+@app.route("/api/profile/build_cf_model", methods=["POST"])
+def api_profile_build_cf_model():
+    if not profile_authorized(request.headers):
+        return jsonify({"error": "Profiling hanya untuk admin (header X-Profile-Token)"}), 403
+    mode = "cpu" if (request.args.get("mode") or "").lower() == "cpu" else "mem"
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "Profiling lain sedang berjalan"}), 409
+    try:
+        profiler = Profiler(mode, "build_cf_model")
+        profiler.start()
+        try:
+            mat, _, _ = build_cf_model()
+        except Exception:
+            profiler.cancel()
+            raise
+        report = profiler.stop()
+    finally:
+        profile_lock.release()
+    report["users"], report["cafes"] = int(mat.shape[0]), int(mat.shape[1])
+    return jsonify(report)
+
+@app.route("/api/sentiment/warmup", methods=["POST"])
+def api_sentiment_warmup():
+    warmed = warm_sentiment_cache()
+    saved = snapshot_sentiment_cache()
+    return jsonify({"warmed": warmed, "saved": saved})
 
 # api evaluasi 
 @app.route("/api/evaluate")
 def api_evaluate():
+    body, status = evaluate_model(request.args)
+    return jsonify(body), status
+
+def evaluate_model(args):
     users = fetch_all_users(force=True)
     if not users:
-        return jsonify({"error": "No users found"}), 400
+        return {"error": "No users found"}, 400
 
     try:
-        M = int(request.args.get("m", 3))
+        M = int(args.get("m", 3))
     except (ValueError, TypeError):
         M = 3
     if M < 1:
         M = 1
 
     try:
-        folds = int(request.args.get("folds", 5))
+        folds = int(args.get("folds", 5))
     except (ValueError, TypeError):
         folds = 5
     if folds < 2:
         folds = 2
 
+    engine = (args.get("engine") or DEFAULT_ENGINE).strip().lower()
+    if engine not in CF_ENGINES:
+        return {"error": f"engine harus salah satu dari {', '.join(CF_ENGINES)}"}, 400
+    vf = (args.get("vf") or DEFAULT_VF).strip().lower()
+    if vf not in VF_SIGNALS:
+        return {"error": f"vf harus salah satu dari {', '.join(VF_SIGNALS)}"}, 400
+    seq_model = SequenceModel().update(users) if vf == "ngram" else None
+
+    # sentimen seluruh kafe diambil paralel sekali di awal
+    prefetch_sentiments(list(cafe_index().keys()))
+
     # evaluasi urutan (ranking) rekomendasi
+    build_start = time.perf_counter()
     mat, sim, knn = build_cf_model()
+    ann = build_ann_model(mat) if engine == "ubcf_ann" else None
+    # ALS dilatih tanpa M kunjungan terakhir tiap pengguna (item yang diuji)
+    als = build_als_model(users, interactions=lambda u: holdout_interactions(u, M)) if engine == "als" else None
+    cf_scores = cf_scorer(engine, mat, sim, knn, model=ann if als is None else als, users=users)
+    build_ms = (time.perf_counter() - build_start) * 1000.0
+    score_s = 0.0
+    score_calls = 0
     vf_by_user = {}
     co_by_user = {}
     for u in users:
@@ -561,7 +2338,13 @@ def api_evaluate():
         except (ValueError, TypeError):
             continue
         try:
-            vf_by_user[uid] = rec_visited_freq(uid)
+            if seq_model is not None:
+                # konteks = riwayat tanpa M kunjungan yang diuji; transisi milik pengguna sendiri
+                # (seluruh urutan, termasuk yang diuji) tetap dikeluarkan dari hitungan model
+                my_seq = _normalize_visited_list(u.get("cafe_telah_dikunjungi"))
+                vf_by_user[uid] = seq_model.score(my_seq[:-M], exclude=my_seq)
+            else:
+                vf_by_user[uid] = rec_visited_freq(uid)
         except Exception:
             vf_by_user[uid] = {}
         try:
@@ -601,7 +2384,14 @@ def api_evaluate():
         relevant_set = set(seq[-M:])
         seen_hist = set(seq[:-M])
 
-        ubcf_raw = rec_ubcf_scores(uid, mat, sim, knn)
+        t0 = time.perf_counter()
+        if als is not None:
+            # hanya riwayat yang dibuang; kafe uji tetap bisa direkomendasikan
+            ubcf_raw = rec_als_scores(uid, als, seq[:-M], exclude=seen_hist)
+        else:
+            ubcf_raw = cf_scores(uid)
+        score_s += time.perf_counter() - t0
+        score_calls += 1
         vf_raw = vf_by_user.get(uid, {})
         co_raw = co_by_user.get(uid, {})
 
@@ -619,13 +2409,14 @@ def api_evaluate():
         max_vf = max(vf_raw.values()) if vf_raw else 1.0
         max_co = max(co_counts_eval.values()) if co_counts_eval else 1.0
 
+        infos = fetch_cafes(pool)
         scores = {}
         for cid in pool:
             cf_n = ubcf_raw.get(cid, 0.0) / max_cf if max_cf > 0 else 0.0
             vf_n = vf_raw.get(cid, 0.0) / max_vf if max_vf > 0 else 0.0
             co_n = co_counts_eval.get(cid, 0.0) / max_co if max_co > 0 else 0.0
 
-            info = fetch_cafe(cid) or {}
+            info = infos.get(int(cid)) or {}
             try:
                 rating_val = float(info.get("rating", 0.0))
             except (ValueError, TypeError):
@@ -681,6 +2472,13 @@ def api_evaluate():
     ndcg_at_k = {f"ndcg@{k}": round((ndcg_sums[k] / eval_user_count) if eval_user_count else 0.0, 4) for k in ks}
 
     response = {
+        "engine": engine,
+        "vf": vf,
+        "timing": {
+            "build_ms": round(build_ms, 2),
+            "score_ms_per_user": round(score_s * 1000.0 / score_calls, 4) if score_calls else 0.0,
+        },
+        **({"ann": ann_recall(ann)} if ann is not None else {}),
         "ranking_metrics": {
             "precision": {**precision_at_k},
             "recall": {**recall_at_k},
@@ -706,6 +2504,8 @@ def api_evaluate():
             train_users.extend(user_folds[j])
 
         mat_t, sim_t, knn_t = build_cf_model_from_users(train_users)
+        cf_scores_t = cf_scorer(engine, mat_t, sim_t, knn_t, users=train_users)
+        seq_model_t = SequenceModel().update(train_users) if vf == "ngram" else None
 
         mse_list_fold = []
         mae_list_fold = []
@@ -725,11 +2525,13 @@ def api_evaluate():
             test_cafe = seq[-1]
             seen_hist = set(seq[:-1])
 
-            ubcf_raw = {}
-            if not mat_t.empty and uid in mat_t.index:
-                ubcf_raw = rec_ubcf_scores(uid, mat_t, sim_t, knn_t)
+            # pengguna uji tidak ada di model latih; IBCF/ALS memakai riwayat tanpa kafe uji
+            ubcf_raw = cf_scores_t(uid, seq[:-1])
 
-            vf_raw = compute_vf_from_users_for_uid(uid, train_users)
+            if seq_model_t is not None:
+                vf_raw = seq_model_t.score(seq[:-1])
+            else:
+                vf_raw = compute_vf_from_users_for_uid(uid, train_users)
             co_raw = compute_cooccur_from_users_for_uid(uid, train_users)
 
             pool = build_candidate_pool_from_signals(ubcf_raw, vf_raw, co_raw, top_n_each=50)
@@ -744,13 +2546,14 @@ def api_evaluate():
             max_vf_t = max(vf_raw.values()) if vf_raw else 1.0
             max_co_t = max(co_counts_t.values()) if co_counts_t else 1.0
 
+            infos = fetch_cafes(pool)
             scores = {}
             for cid in pool:
                 cf_n = ubcf_raw.get(cid, 0.0) / max_cf_t if max_cf_t > 0 else 0.0
                 vf_n = vf_raw.get(cid, 0.0) / max_vf_t if max_vf_t > 0 else 0.0
                 co_n = co_counts_t.get(cid, 0.0) / max_co_t if max_co_t > 0 else 0.0
 
-                info = fetch_cafe(cid) or {}
+                info = infos.get(int(cid)) or {}
                 try:
                     rating_val = float(info.get("rating", 0.0))
                 except (ValueError, TypeError):
@@ -802,35 +2605,17 @@ def api_evaluate():
         "MAE": round(mean_mae_cv, 4),
     }
 
-    return jsonify(response)
+    return response, 200
 
-def build_cf_model_from_users(users_list):
-    records = []
-    for u in users_list:
-        uid = u.get("id_user") or u.get("id") or u.get("user_id")
-        if uid is None:
-            continue
-        raw = u.get("menu_yang_disukai") or "[]"
-        try:
-            favs = json.loads(raw) if isinstance(raw, str) else raw
-        except json.JSONDecodeError:
-            favs = []
-        for m in (favs if isinstance(favs, list) else []):
-            if isinstance(m, dict) and "id_cafe" in m and "harga" in m:
-                try:
-                    records.append({
-                        "user_id": int(uid),
-                        "cafe_id": int(m["id_cafe"]),
-                        "harga":   int(str(m["harga"]).replace(".", ""))
-                    })
-                except (ValueError, TypeError):
-                    pass
-
-    if not records:
-        return pd.DataFrame(), pd.DataFrame(), None
+# matriks pengguna x kafe (harga menu favorit) tanpa menghitung kemiripan
+def interaction_matrix(users_list):
+    df = profile_store(users_list).interaction_frame()
+    if df.empty:
+        return pd.DataFrame()
+    return df.pivot_table(index="user_id", columns="cafe_id", values="harga", fill_value=0)
 
-    df = pd.DataFrame(records)
-    mat = df.pivot_table(index="user_id", columns="cafe_id", values="harga", fill_value=0)
+def build_cf_model_from_users(users_list):
+    mat = interaction_matrix(users_list)
     if mat.empty:
         return pd.DataFrame(), pd.DataFrame(), None
 
@@ -854,81 +2639,20 @@ def build_cf_model_from_users(users_list):
     return mat, sim, knn
 
 def compute_vf_from_users_for_uid(uid, users_list):
-    raw_me = fetch_visited(uid)
-    my_seq = _normalize_visited_list(raw_me)
+    my_seq = _normalize_visited_list(fetch_visited(uid))
     if not my_seq:
         return {}
-
-    trans = defaultdict(list)
-    for other in users_list:
-        try:
-            other_id = int(other.get("id_user", other.get("id", -1)))
-            if other_id == int(uid):
-                continue
-        except (ValueError, TypeError):
-            continue
-
-        raw = other.get("cafe_telah_dikunjungi") or "[]"
-        seq2 = _normalize_visited_list(raw)
-        for a, b in zip(seq2, seq2[1:]):
-            try:
-                trans[int(a)].append(int(b))
-            except (ValueError, TypeError):
-                continue
-
-    flat = []
-    for a in my_seq:
-        try:
-            flat.extend(trans.get(int(a), []))
-        except (ValueError, TypeError):
-            continue
-
-    if not flat:
-        return {}
-    counts = {}
-    for v in flat:
-        counts[v] = counts.get(v, 0) + 1
-    return counts
+    store = profile_store(users_list)
+    return store.transition_counts(my_seq, exclude_row=store.pos.get(int(uid), -1))
 
 def compute_cooccur_from_users_for_uid(uid, users_list):
     me = fetch_user(uid)
     if not me:
         return {}
-
-    raw = me.get("menu_yang_disukai") or "[]"
-    try:
-        my_list = json.loads(raw) if isinstance(raw, str) else raw
-    except json.JSONDecodeError:
-        my_list = []
-
-    my_menus = {m["nama_menu"] for m in my_list if isinstance(m, dict) and "nama_menu" in m}
-    if not my_menus:
-        return {}
-
-    cooc = defaultdict(set)
-    for other in users_list:
-        try:
-            other_id = other.get("id_user") or other.get("id")
-            if other_id is None or str(other_id) == str(uid):
-                continue
-        except Exception:
-            continue
-
-        raw2 = other.get("menu_yang_disukai") or "[]"
-        try:
-            favs2 = json.loads(raw2) if isinstance(raw2, str) else raw2
-        except json.JSONDecodeError:
-            favs2 = []
-
-        for m in (favs2 if isinstance(favs2, list) else []):
-            if not isinstance(m, dict) or "nama_menu" not in m:
-                continue
-            if m.get("nama_menu") in my_menus:
-                try:
-                    cooc[int(m["id_cafe"])].add(m["nama_menu"])
-                except (ValueError, TypeError):
-                    pass
-    return {cid: sorted(list(ms)) for cid, ms in cooc.items()}
+    store = profile_store(users_list)
+    my_menus = [store.menu_index.get(m["nama_menu"]) for m in _favourite_list(me)
+                if isinstance(m, dict) and "nama_menu" in m]
+    return store.cooccur(my_menus, exclude_row=store.pos.get(int(uid), -1))
 
 def k_fold_split_users(users_list, k=5, seed=42):
     candidates = []
@@ -949,5 +2673,9 @@ def k_fold_split_users(users_list, k=5, seed=42):
         folds[idx % k].append(user)
     return folds
 
+load_sentiment_cache()
+
 if __name__ == "__main__":
+    start_sentiment_snapshotter()
+    warm_sentiment_cache()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,135 @@
+# precompute.py
+# Job batch: hitung Top-N rekomendasi untuk seluruh pengguna dan simpan ke file SQLite
+# yang dibaca /api/recommend/<uid>?precomputed=1.
+# Data & model dimuat sekali di proses induk, lalu worker di-fork (snapshot dipakai bersama
+# lewat copy-on-write) dan masing-masing mengerjakan shard pengguna.
+# Contoh pakai:
+#   python precompute.py --workers 4 --shards 16
+#   python precompute.py --top-n 10 --output /tmp/recommendations.sqlite
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import main
+
+
+def load_snapshot():
+    main.load_sentiment_cache()
+    main.warm_sentiment_cache()
+    main.fetch_all_cafes()
+    users = main.fetch_all_users()
+    main.get_cf_model()
+    main.cafe_index()
+    main.content_model()
+    main.freeze_caches()
+    # koneksi milik proses induk tidak boleh dipakai bersama oleh worker
+    main.session.close()
+    uids = []
+    for u in users:
+        try:
+            uids.append(int(u.get("id_user", u.get("id", -1))))
+        except (ValueError, TypeError):
+            continue
+    return sorted(set(uids))
+
+
+def run_shard(task):
+    shard, uids, top_n = task
+    t0 = time.perf_counter()
+    rows = []
+    failed = 0
+    for uid in uids:
+        try:
+            body = main.recommend_for_user(uid, top_n=top_n)
+        except Exception as e:
+            print(f"Shard {shard}: gagal menghitung pengguna {uid}: {e}")
+            failed += 1
+            continue
+        rows.append((uid, json.dumps(body["recommendations"])))
+    elapsed = time.perf_counter() - t0
+    stats = {
+        "shard": shard,
+        "users": len(uids),
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "users_per_s": round(len(uids) / elapsed, 1) if elapsed > 0 else None,
+        "pid": os.getpid(),
+    }
+    return rows, stats
+
+
+# tulis ke file sementara lalu os.replace, jadi pembaca selalu melihat hasil build yang utuh
+def write_output(path, rows, top_n, build):
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    with conn:
+        conn.execute(
+            "CREATE TABLE recommendations (uid INTEGER PRIMARY KEY, top_n INTEGER, model_version TEXT, built_at REAL, recs TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO recommendations (uid, top_n, model_version, built_at, recs) VALUES (?, ?, ?, ?, ?)",
+            [(uid, top_n, main.MODEL_VERSION, build["built_at"], recs) for uid, recs in rows],
+        )
+        conn.execute(
+            "CREATE TABLE builds (built_at REAL, users INTEGER, shards INTEGER, workers INTEGER, build_seconds REAL, shard_stats TEXT)"
+        )
+        conn.execute(
+            "INSERT INTO builds (built_at, users, shards, workers, build_seconds, shard_stats) VALUES (?, ?, ?, ?, ?, ?)",
+            (build["built_at"], build["users"], build["shards"], build["workers"], build["build_seconds"],
+             json.dumps(build["shard_stats"])),
+        )
+    conn.close()
+    os.replace(tmp, path)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Precompute rekomendasi Top-N untuk seluruh pengguna.")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--shards", type=int, default=0, help="Jumlah shard (default: 4x workers)")
+    parser.add_argument("--top-n", type=int, default=main.MAX_TOP_N)
+    parser.add_argument("--output", default=main.PRECOMPUTED_FILE)
+    args = parser.parse_args()
+
+    started = time.time()
+    t0 = time.perf_counter()
+    uids = load_snapshot()
+    load_s = time.perf_counter() - t0
+    print(f"Snapshot dimuat dalam {load_s:.2f} s: {len(uids)} pengguna")
+
+    workers = max(1, args.workers)
+    n_shards = max(1, min(args.shards or workers * 4, len(uids) or 1))
+    tasks = [(i, uids[i::n_shards], args.top_n) for i in range(n_shards)]
+
+    rows = []
+    shard_stats = []
+    t1 = time.perf_counter()
+    # fork: worker mewarisi snapshot yang sudah dimuat tanpa serialisasi ulang
+    with multiprocessing.get_context("fork").Pool(processes=workers) as pool:
+        for shard_rows, stats in pool.imap_unordered(run_shard, tasks):
+            rows.extend(shard_rows)
+            shard_stats.append(stats)
+            print(f"Shard {stats['shard']:>3}: {stats['users']:>6} pengguna, {stats['seconds']:>8.2f} s, "
+                  f"{stats['users_per_s']} pengguna/s")
+    score_s = time.perf_counter() - t1
+
+    build = {
+        "built_at": started,
+        "users": len(rows),
+        "shards": n_shards,
+        "workers": workers,
+        "build_seconds": round(time.perf_counter() - t0, 3),
+        "shard_stats": sorted(shard_stats, key=lambda s: s["shard"]),
+    }
+    write_output(args.output, rows, args.top_n, build)
+    print(f"Skoring {len(rows)} pengguna dalam {score_s:.2f} s ({len(rows) / score_s if score_s else 0:.1f} pengguna/s)")
+    print(f"Total build {build['build_seconds']:.2f} s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,66 @@
+# profile_memory.py
+# Bandingkan memori daftar pengguna mentah (JSON /api/users, seperti yang dulu disimpan di cache)
+# dengan ProfileStore (array NumPy bergaya CSR yang dipakai fungsi sinyal).
+# Contoh pakai:
+#   python profile_memory.py --base http://127.0.0.1:8080
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import requests
+
+from main import ProfileStore
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = (time.perf_counter() - t0) * 1000.0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, peak, elapsed
+
+
+# kolom JSON (kunjungan & menu favorit) ikut diparse, seperti yang dilakukan fungsi sinyal di tiap panggilan
+def parse_json_columns(users):
+    parsed = []
+    for u in users:
+        row = dict(u)
+        for k in ("cafe_telah_dikunjungi", "menu_yang_disukai"):
+            if isinstance(row.get(k), str):
+                try:
+                    row[k] = json.loads(row[k])
+                except ValueError:
+                    row[k] = []
+        parsed.append(row)
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perbandingan memori user list mentah vs ProfileStore.")
+    parser.add_argument("--base", default="http://127.0.0.1:8080")
+    args = parser.parse_args()
+
+    body = requests.get(args.base.rstrip("/") + "/api/users", headers={"Accept": "application/json"}, timeout=30).content
+
+    raw, raw_mem, raw_peak, raw_ms = measure(lambda: json.loads(body))
+    _, parsed_mem, parsed_peak, parsed_ms = measure(lambda: parse_json_columns(raw))
+    store, store_mem, store_peak, store_ms = measure(lambda: ProfileStore(raw))
+
+    print(f"Pengguna: {len(raw)}, kunjungan: {len(store.visit_ids)}, menu favorit: {len(store.fav_cafe)}")
+    print(f"{'Representasi':<32} {'Memori (KB)':>12} {'Puncak (KB)':>12} {'Waktu ms':>9}")
+    print(f"{'JSON mentah (list of dict)':<32} {raw_mem / 1024:>12.1f} {raw_peak / 1024:>12.1f} {raw_ms:>9.2f}")
+    print(f"{'+ kolom JSON diparse':<32} {parsed_mem / 1024:>12.1f} {parsed_peak / 1024:>12.1f} {parsed_ms:>9.2f}")
+    print(f"{'ProfileStore':<32} {store_mem / 1024:>12.1f} {store_peak / 1024:>12.1f} {store_ms:>9.2f}")
+    print(f"  array NumPy saja: {store.nbytes() / 1024:.1f} KB")
+    if store_mem:
+        print(f"Rasio JSON mentah / ProfileStore: {raw_mem / store_mem:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
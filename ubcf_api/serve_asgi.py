@@ -0,0 +1,49 @@
+# serve_asgi.py
+# Menjalankan asgi:app dengan beberapa worker (gunicorn + uvicorn worker).
+# Model dimuat sekali di proses master (preload_app) lalu worker di-fork,
+# sehingga matriks model dipakai bersama lewat copy-on-write.
+# Contoh pakai:
+#   python serve_asgi.py --workers 4 --port 8000
+
+import argparse
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+
+class ASGIServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from asgi import app
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jalankan service rekomendasi dalam mode ASGI multi-worker.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(2, multiprocessing.cpu_count()),
+        help="Jumlah proses worker (default: jumlah CPU)",
+    )
+    args = parser.parse_args()
+
+    ASGIServer({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()